@@ -1,10 +1,33 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 
 load_dotenv()
 
-app = FastAPI()
+from app import config
+from app.services.datasetCache import dataset_cache
+from app.services.datasetRefresher import dataset_refresher
+from app.services.metrics import MetricsMiddleware, loop_lag_monitor
+from app.services.renderPool import render_pool
+from app.services.upstreamClient import upstream_client
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await upstream_client.start()
+    loop_lag_monitor.start()
+    if config.DATASET_REFRESH_ENABLED:
+        dataset_refresher.start()
+    yield
+    await dataset_refresher.stop()
+    await dataset_cache.flush()
+    await upstream_client.close()
+    await loop_lag_monitor.stop()
+    render_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,13 +36,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it wraps everything, CORS included
+app.add_middleware(MetricsMiddleware)
 
-from app.routes_and_controllers import heartDisease, patientSugarLevel, factorsOfHeartDiseases, lungCancer
+from app.routes_and_controllers import heartDisease, patientSugarLevel, factorsOfHeartDiseases, lungCancer, datasetStatus, serviceMetrics
 
 app.include_router(heartDisease.router, prefix="/heartDisease", tags = ["heartDisease"])
 app.include_router(patientSugarLevel.router, prefix="/patientSugarLevel", tags=["patientSugarLevel"])
 app.include_router(factorsOfHeartDiseases.router, prefix = "/factorsOfHeartDiseases", tags=["factorsOfHeartDiseases"])
 app.include_router(lungCancer.router, prefix = "/lungCancer", tags=["lungCancer"])
+app.include_router(datasetStatus.router, prefix="/datasets", tags=["datasets"])
+app.include_router(serviceMetrics.router, tags=["metrics"])
 
 
 
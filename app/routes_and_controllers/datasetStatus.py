@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app import config
+from app.services.datasetCache import dataset_cache
+from app.services.datasetRefresher import dataset_refresher
+
+router = APIRouter()
+
+@router.get("/status")
+async def dataset_status():
+    datasets = {}
+    for endpoint in dataset_refresher.endpoints:
+        status = dataset_cache.status(endpoint)
+        status["next_refresh_in"] = dataset_refresher.next_refresh_in(endpoint)
+        datasets[endpoint] = status
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "refresher_running": dataset_refresher.running,
+            "refresh_interval": config.DATASET_REFRESH_INTERVAL,
+            "ttl": config.DATASET_CACHE_TTL,
+            "max_stale": config.DATASET_MAX_STALE,
+            "datasets": datasets,
+        },
+    )
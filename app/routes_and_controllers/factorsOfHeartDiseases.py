@@ -1,78 +1,43 @@
-from fastapi import APIRouter, HTTPException, Response
-from io import BytesIO
-import statsmodels.api as sm
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from typing import List, Literal, Union
 import pandas as pd
-import seaborn as sns
-import matplotlib
-matplotlib.use('Agg')  # Use a non-interactive backend
-import matplotlib.pyplot as plt
-import httpx
+from pydantic import BaseModel, Field
+from app.services.chartBundle import chart_bundle
+from app.services.chartCache import cached_chart
+from app.services.chartOutput import ChartOptions, chart_content
+from app.services.aggregates import cube_cache
+from app.services.chartData import box_table, histogram_table
+from app.services.cohorts import Cohort, cohort_index
+from app.services.datasetCache import HEART_DISEASE
+from app.services.encoding import AGE_ORDER, BMI_ORDER, mask
+from app.services.riskModels import HEART_DISEASE_RISK, heart_disease_features, model_cache
 
 router = APIRouter()
 
 
 @router.get("/bmi-Vs-Heart")
-async def bmiVsHeart():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def bmiVsHeart(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-        else:
-            print("Fetched data successfully")
-
-            # Ensure 'HeartDisease' column is binary (1 for 'Yes' and 0 for 'No')
-            fetchedData['HeartDisease'] = fetchedData['HeartDisease'].apply(lambda x: 1 if x == 'Yes' else 0)
-
-            # Categorize BMI
-            def categorize_bmi(bmi):
-                if bmi < 18.5:
-                    return 'Underweight (0-18.5)'
-                elif 18.5 <= bmi < 24.9:
-                    return 'Normal (18.5-24.9)'
-                elif 25 <= bmi < 29.9:
-                    return 'Overweight (25-29.9)'
-                elif 30 <= bmi < 34.9:
-                    return 'Obese (30-34.9)'
-                else:
-                    return 'Severely Obese (35+)'
-
-            fetchedData['BMI_Category'] = fetchedData['BMI'].apply(categorize_bmi)
-
-            # Order categories
-            bmi_order = ['Underweight (0-18.5)', 'Normal (18.5-24.9)', 'Overweight (25-29.9)', 'Obese (30-34.9)',
-                         'Severely Obese (35+)']
-            fetchedData['BMI_Category'] = pd.Categorical(fetchedData['BMI_Category'], categories=bmi_order, ordered=True)
-
-            print("Starting to plot.........")
-
-            # Plotting
-            plt.figure(figsize=(8, 6))
-            sns.countplot(x='BMI_Category', hue='HeartDisease', data=fetchedData, palette="coolwarm")
-            plt.title('Heart Disease Prevalence by BMI Category')
-            plt.xlabel('BMI Category')
-            plt.ylabel('Count')
-            plt.legend(title='Heart Disease', loc='upper right', labels=['No', 'Yes'])
-            plt.tight_layout()
-
-            print("Plotting completed....")
-
-            # Save the plot to a BytesIO object
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='svg')
-            img_buffer.seek(0)
-            plt.close()
-
-            print("Image conversion done........")
-
-            headers = {"Content-Disposition": "inline; filename=bmiVsHeart.svg"}
-            return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        cube = await cube_cache.get(HEART_DISEASE, cohort)
+
+        # Heart disease counts per BMI category, in BMI order
+        counts = cube.count_table('BMI_Category', order=BMI_ORDER)
+
+        # Plotting
+        spec = {
+            'kind': 'bar', 'x': 'BMI_Category', 'y': 'Count', 'hue': 'HeartDisease', 'palette': 'coolwarm',
+            'order': BMI_ORDER, 'hue_order': ['No', 'Yes'],
+            'title': 'Heart Disease Prevalence by BMI Category', 'xlabel': 'BMI Category', 'ylabel': 'Count',
+            'legend': {'title': 'Heart Disease', 'loc': 'upper right'}, 'tight_layout': True,
+        }
+        content = await chart_content(spec, counts, output)
+
+        headers = {"Content-Disposition": f"inline; filename=bmiVsHeart.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
@@ -80,94 +45,52 @@ async def bmiVsHeart():
 
 
 @router.get("/smokingHeart")
-async def count_plot_smoking_habits():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def count_plot_smoking_habits(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-        else:
-            print("Fetched data successfully")
-
-            fetchedData['HeartDisease'] = fetchedData['HeartDisease'].apply(lambda x: 1 if x == 'Yes' else 0)
-            # Filter to include only heart disease cases
-
-            df_heart_disease = fetchedData[fetchedData['HeartDisease'] == 1]
-            print("Starting to plot.........")
-
-            # Plotting
-            plt.figure(figsize=(8, 6))
-            sns.countplot(x='Smoking', data=df_heart_disease, palette="coolwarm")
-            plt.title('Smoking Habits of Individuals with Heart Disease')
-            plt.xlabel('Smoking')
-            plt.ylabel('Count')
-            plt.tight_layout()
-
-            print("Plotting completed....")
-
-            # Save the plot to a BytesIO object
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='svg')
-            img_buffer.seek(0)
-            plt.close()
-
-            print("Image conversion done........")
-
-            headers = {"Content-Disposition": "inline; filename=smokingHeart.svg"}
-            return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        cube = await cube_cache.get(HEART_DISEASE, cohort)
+
+        # Counts among heart disease cases only
+        counts = cube.count_table('Smoking', level='Yes')
+
+        # Plotting
+        spec = {
+            'kind': 'bar', 'x': 'Smoking', 'y': 'Count', 'palette': 'coolwarm',
+            'title': 'Smoking Habits of Individuals with Heart Disease', 'xlabel': 'Smoking', 'ylabel': 'Count',
+            'tight_layout': True,
+        }
+        content = await chart_content(spec, counts, output)
+
+        headers = {"Content-Disposition": f"inline; filename=smokingHeart.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
 
 
 @router.get("/alcoholHeart")
-async def count_plot_alcohol_drinking():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def count_plot_alcohol_drinking(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-        else:
-            print("Fetched data successfully")
-
-            fetchedData['HeartDisease'] = fetchedData['HeartDisease'].apply(lambda x: 1 if x == 'Yes' else 0)
-            # Filter to include only heart disease cases
-            df_heart_disease = fetchedData[fetchedData['HeartDisease'] == 1]
-
-            print("Starting to plot.........")
-
-            # Plotting
-            plt.figure(figsize=(8, 6))
-            sns.countplot(x='AlcoholDrinking', data=df_heart_disease, palette="coolwarm")
-            plt.title('Alcohol Drinking for Individuals with Heart Disease')
-            plt.xlabel('Alcohol Drinking')
-            plt.ylabel('Count')
-            plt.tight_layout()
-
-            print("Plotting completed....")
-
-            # Save the plot to a BytesIO object
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='svg')
-            img_buffer.seek(0)
-            plt.close()
-
-            print("Image conversion done........")
-
-            headers = {"Content-Disposition": "inline; filename=alcoholHeart.svg"}
-            return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        cube = await cube_cache.get(HEART_DISEASE, cohort)
+
+        # Counts among heart disease cases only
+        counts = cube.count_table('AlcoholDrinking', level='Yes')
+
+        # Plotting
+        spec = {
+            'kind': 'bar', 'x': 'AlcoholDrinking', 'y': 'Count', 'palette': 'coolwarm',
+            'title': 'Alcohol Drinking for Individuals with Heart Disease', 'xlabel': 'Alcohol Drinking',
+            'ylabel': 'Count', 'tight_layout': True,
+        }
+        content = await chart_content(spec, counts, output)
+
+        headers = {"Content-Disposition": f"inline; filename=alcoholHeart.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
@@ -175,391 +98,289 @@ async def count_plot_alcohol_drinking():
 
 
 @router.get("/physicalActivity-Sleep-HealthyHeart")
-async def box_plot_physical_activity_vs_sleep_time():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def box_plot_physical_activity_vs_sleep_time(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-        else:
-            print("Fetched data successfully")
-
-            fetchedData['HeartDisease'] = fetchedData['HeartDisease'].apply(lambda x: 1 if x == 'Yes' else 0)
-            # Filter to include only heart disease cases
-            df_heart_disease = fetchedData[fetchedData['HeartDisease'] == 1]
-
-            print("Starting to plot.........")
-
-            # Plotting
-            plt.figure(figsize=(8, 6))
-            sns.boxplot(x='PhysicalActivity', y='SleepTime', data=df_heart_disease, palette="coolwarm")
-            plt.title('Physical Activity vs. Sleep Time for Individuals with Heart Disease')
-            plt.xlabel('Physical Activity (Yes/No)')
-            plt.ylabel('Sleep Time (hours)')
-            plt.tight_layout()
-
-            print("Plotting completed....")
-
-            # Save the plot to a BytesIO object
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='svg')
-            img_buffer.seek(0)
-            plt.close()
-
-            print("Image conversion done........")
-            headers = {"Content-Disposition": "inline; filename=box_physical_activity_sleep_time.svg"}
-            return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        fetchedData = await cohort_index.get_frame(HEART_DISEASE, cohort)
+
+        # Filter to include only heart disease cases
+        df_heart_disease = fetchedData[mask(fetchedData['HeartDisease'])]
+        boxes = box_table(df_heart_disease, 'PhysicalActivity', 'SleepTime')
+
+        # Plotting
+        spec = {
+            'kind': 'box', 'x': 'PhysicalActivity', 'palette': 'coolwarm',
+            'title': 'Physical Activity vs. Sleep Time for Individuals with Heart Disease',
+            'xlabel': 'Physical Activity (Yes/No)', 'ylabel': 'Sleep Time (hours)', 'tight_layout': True,
+        }
+        content = await chart_content(spec, boxes, output)
+
+        headers = {"Content-Disposition": f"inline; filename=box_physical_activity_sleep_time.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
 
 
 @router.get("/generalHealth-Heart")
-async def bar_plot_general_health_vs_heart_disease():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def bar_plot_general_health_vs_heart_disease(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-        else:
-            print("Fetched data successfully")
-
-            # Order General Health categories
-            gen_health_order = ['Excellent', 'Very good', 'Good', 'Fair', 'Poor']
-            fetchedData['GenHealth'] = pd.Categorical(fetchedData['GenHealth'], categories=gen_health_order, ordered=True)
-
-            print("Starting to plot.........")
-
-            # Plot ordered General Health vs Heart Disease
-            plt.figure(figsize=(8, 6))
-            sns.barplot(x='GenHealth', y='HeartDisease', data=fetchedData, hue='GenHealth', palette="coolwarm", legend=False)
-            plt.title('Heart Disease Prevalence by General Health')
-            plt.xlabel('General Health')
-            plt.ylabel('Prevalence of Heart Disease (0.10 = 10%)')  # Clarified the meaning of prevalence
-            plt.tight_layout()
-
-            print("Plotting completed....")
-
-            # Save the plot to a BytesIO object
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='svg')
-            img_buffer.seek(0)
-            plt.close()
-
-            print("Image conversion done........")
-
-            headers = {"Content-Disposition": "inline; filename=generalHealth-Heart.svg"}
-            return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        cube = await cube_cache.get(HEART_DISEASE, cohort)
+
+        # Order General Health categories
+        gen_health_order = ['Excellent', 'Very good', 'Good', 'Fair', 'Poor']
+        prevalence = cube.prevalence_table('GenHealth', order=gen_health_order)
+
+        # Plot ordered General Health vs Heart Disease
+        spec = {
+            'kind': 'bar', 'x': 'GenHealth', 'y': 'Prevalence', 'palette': 'coolwarm', 'error': 'Error',
+            'order': gen_health_order,
+            'title': 'Heart Disease Prevalence by General Health', 'xlabel': 'General Health',
+            'ylabel': 'Prevalence of Heart Disease (0.10 = 10%)',  # Clarified the meaning of prevalence
+            'tight_layout': True,
+        }
+        content = await chart_content(spec, prevalence, output)
+
+        headers = {"Content-Disposition": f"inline; filename=generalHealth-Heart.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
 
 
 @router.get("/sleepVsHeart-modified")
-async def histogram_sleep_time_vs_heart_disease():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def histogram_sleep_time_vs_heart_disease(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-        else:
-            print("Fetched data successfully")
-
-            print("Starting to plot.........")
-
-            # Plot histogram of Sleep Time vs. Heart Disease
-            plt.figure(figsize=(8, 6))
-            sns.histplot(data=fetchedData, x='SleepTime', hue='HeartDisease', kde=True,
-                         palette="coolwarm", multiple="stack")
-            plt.title('Distribution of Sleep Time and Heart Disease')
-            plt.xlabel('Sleep Time (hours)')
-            plt.ylabel('Frequency')
-            plt.tight_layout()
-
-            print("Plotting completed....")
-
-            # Save the plot to a BytesIO object
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='svg')
-            img_buffer.seek(0)
-            plt.close()
-
-            print("Image conversion done........")
-
-            headers = {"Content-Disposition": "inline; filename=sleepVsHeartModified.svg"}
-            return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        fetchedData = await cohort_index.get_frame(HEART_DISEASE, cohort)
+
+        histogram = histogram_table(fetchedData, 'SleepTime', 'HeartDisease')
+
+        # Plot histogram of Sleep Time vs. Heart Disease
+        spec = {
+            'kind': 'hist', 'hue': 'HeartDisease', 'palette': 'coolwarm',
+            'title': 'Distribution of Sleep Time and Heart Disease', 'xlabel': 'Sleep Time (hours)',
+            'ylabel': 'Frequency', 'tight_layout': True,
+        }
+        content = await chart_content(spec, histogram, output)
+
+        headers = {"Content-Disposition": f"inline; filename=sleepVsHeartModified.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
 
 @router.get("/physicalActivity-HeartDiseases")
-async def count_plot_physical_activity_vs_heart_disease():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def count_plot_physical_activity_vs_heart_disease(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-        else:
-            print("Fetched data successfully")
-
-            fetchedData['HeartDisease'] = fetchedData['HeartDisease'].apply(lambda x: 1 if x == 'Yes' else 0)
-
-            # Filter the dataset to include only individuals with heart disease
-            df_heart_disease = fetchedData[fetchedData['HeartDisease'] == 1]
-
-            print("Starting to plot.........")
-
-            # Plot count of Physical Activity for individuals with heart disease
-            plt.figure(figsize=(8, 6))
-            sns.countplot(x='PhysicalActivity', data=df_heart_disease, palette="coolwarm")
-            plt.title('Physical Activity for Individuals with Heart Disease')
-            plt.xlabel('Physical Activity (Yes/No)')
-            plt.ylabel('Count')
-            plt.tight_layout()
-
-            print("Plotting completed....")
-
-            # Save the plot to a BytesIO object
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='svg')
-            img_buffer.seek(0)
-            plt.close()
-
-            print("Image conversion done........")
-
-            headers = {"Content-Disposition": "inline; filename=physicalActivity-HeartDiseases.svg"}
-            return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        cube = await cube_cache.get(HEART_DISEASE, cohort)
+
+        # Counts among heart disease cases only
+        counts = cube.count_table('PhysicalActivity', level='Yes')
+
+        # Plot count of Physical Activity for individuals with heart disease
+        spec = {
+            'kind': 'bar', 'x': 'PhysicalActivity', 'y': 'Count', 'palette': 'coolwarm',
+            'title': 'Physical Activity for Individuals with Heart Disease',
+            'xlabel': 'Physical Activity (Yes/No)', 'ylabel': 'Count', 'tight_layout': True,
+        }
+        content = await chart_content(spec, counts, output)
+
+        headers = {"Content-Disposition": f"inline; filename=physicalActivity-HeartDiseases.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
 
 
 @router.get("/ageVsDisease")
-async def age_vs_heart_disease_prevalence():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def age_vs_heart_disease_prevalence(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
+        cube = await cube_cache.get(HEART_DISEASE, cohort)
 
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-
-        print("Fetched data successfully")
-
-        # Ensure data is properly formatted
-        fetchedData['HeartDisease'] = fetchedData['HeartDisease'].apply(lambda x: 1 if x == 'Yes' else 0)
-
-        # Group by age category and calculate heart disease prevalence
-        age_heart_disease = fetchedData.groupby('AgeCategory')['HeartDisease'].mean()
+        # Heart disease prevalence per age category
+        age_heart_disease = cube.prevalence('AgeCategory')
 
         # Plot Age Category vs. Heart Disease Prevalence
-        plt.figure(figsize=(10, 6))
-        sns.barplot(x=age_heart_disease.index, y=age_heart_disease.values, palette="coolwarm")
-        plt.title('Heart Disease Prevalence by Age Category')
-        plt.xlabel('Age Category')
-        plt.ylabel('Prevalence of Heart Disease')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-
-        print("Plotting completed....")
-
-        # Save the plot to a BytesIO object
-        img_buffer = BytesIO()
-        plt.savefig(img_buffer, format='svg')
-        img_buffer.seek(0)
-        plt.close()
-
-        print("Image conversion done........")
-
-        headers = {"Content-Disposition": "inline; filename=ageVsHeartDiseases.svg"}
-        return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        spec = {
+            'kind': 'bar', 'x': 'AgeCategory', 'y': 'HeartDisease', 'palette': 'coolwarm', 'figsize': (10, 6),
+            'title': 'Heart Disease Prevalence by Age Category', 'xlabel': 'Age Category',
+            'ylabel': 'Prevalence of Heart Disease', 'xticks_rotation': 45, 'tight_layout': True,
+        }
+        content = await chart_content(spec, age_heart_disease.reset_index(), output)
+
+        headers = {"Content-Disposition": f"inline; filename=ageVsHeartDiseases.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
 
 @router.get("/bmiVsHeart")
-async def bmi_vs_heart_disease_prevalence():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def bmi_vs_heart_disease_prevalence(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-
-        fetchedData = pd.DataFrame(data)
+        cube = await cube_cache.get(HEART_DISEASE, cohort)
 
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-
-        print("Fetched data successfully")
-
-        # Ensure data is properly formatted
-        fetchedData['HeartDisease'] = fetchedData['HeartDisease'].apply(lambda x: 1 if x == 'Yes' else 0)
-        fetchedData['BMI'] = pd.to_numeric(fetchedData['BMI'], errors='coerce')
-
-        # Define BMI categories
-        def bmi_category(bmi):
-            if bmi < 18.5:
-                return 'Underweight (0-18.5)'
-            elif 18.5 <= bmi < 24.9:
-                return 'Normal (18.5-24.9)'
-            elif 25 <= bmi < 29.9:
-                return 'Overweight (25-29.9)'
-            elif 30 <= bmi < 34.9:
-                return 'Obese (30-34.9)'
-            else:
-                return 'Severely Obese (35+)'
-
-        fetchedData['BMI_Category'] = fetchedData['BMI'].apply(bmi_category)
-
-        # Group by BMI category and calculate heart disease prevalence
-        bmi_heart_disease = fetchedData.groupby('BMI_Category')['HeartDisease'].mean()
+        # Heart disease prevalence per BMI category
+        bmi_heart_disease = cube.prevalence('BMI_Category')
 
         # Plot BMI Category vs. Heart Disease Prevalence
-        plt.figure(figsize=(10, 6))
-        sns.barplot(x=bmi_heart_disease.index, y=bmi_heart_disease.values, palette="coolwarm")
-        plt.title('Heart Disease Prevalence by BMI Category')
-        plt.xlabel('BMI Category')
-        plt.ylabel('Prevalence of Heart Disease')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-
-        print("Plotting completed....")
-
-        # Save the plot to a BytesIO object
-        img_buffer = BytesIO()
-        plt.savefig(img_buffer, format='svg')
-        img_buffer.seek(0)
-        plt.close()
-
-        print("Image conversion done........")
-
-        headers = {"Content-Disposition": "inline; filename=bmi_vs_heart_disease_prevalence.svg"}
-        return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        spec = {
+            'kind': 'bar', 'x': 'BMI_Category', 'y': 'HeartDisease', 'palette': 'coolwarm', 'figsize': (10, 6),
+            'title': 'Heart Disease Prevalence by BMI Category', 'xlabel': 'BMI Category',
+            'ylabel': 'Prevalence of Heart Disease', 'xticks_rotation': 45, 'tight_layout': True,
+        }
+        content = await chart_content(spec, bmi_heart_disease.reset_index(), output)
+
+        headers = {"Content-Disposition": f"inline; filename=bmi_vs_heart_disease_prevalence.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
 
 @router.get("/sexVsHeart")
-async def sex_vs_heart_disease_prevalence():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def sex_vs_heart_disease_prevalence(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
+        cube = await cube_cache.get(HEART_DISEASE, cohort)
 
-        fetchedData = pd.DataFrame(data)
+        # Heart disease prevalence per sex
+        sex_heart_disease = cube.prevalence('Sex')
 
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-
-        print("Fetched data successfully")
+        # Plot Sex vs. Heart Disease Prevalence
+        spec = {
+            'kind': 'bar', 'x': 'Sex', 'y': 'HeartDisease', 'palette': 'coolwarm',
+            'title': 'Heart Disease Prevalence by Sex', 'xlabel': 'Sex', 'ylabel': 'Prevalence of Heart Disease',
+            'tight_layout': True,
+        }
+        content = await chart_content(spec, sex_heart_disease.reset_index(), output)
+
+        headers = {"Content-Disposition": f"inline; filename=sexVsHeart.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        raise HTTPException(status_code=400, detail="Error generating the plot")
 
-        # Ensure data is properly formatted
-        fetchedData['HeartDisease'] = fetchedData['HeartDisease'].apply(lambda x: 1 if x == 'Yes' else 0)
+@router.get("/Logistic_Regression_Coefficients_Heart_Disease_Risk_Factors")
+@cached_chart(HEART_DISEASE)
+async def logistic_regression_coefficients_heart_disease_risk_factors(cohort: Cohort, output: ChartOptions = Depends()):
+    try:
+        # Fitted once per dataset snapshot by the model cache, not per request (per cohort when filtered)
+        model = await model_cache.get(HEART_DISEASE_RISK, cohort)
+        coefficients = pd.DataFrame({'Risk Factor': model.params.index, 'Coefficient': model.params.values})
+        spec = {
+            'kind': 'bar', 'x': 'Risk Factor', 'y': 'Coefficient', 'color': 'skyblue',
+            'title': 'Logistic Regression Coefficients for Heart Disease Risk Factors', 'xlabel': 'Risk Factors',
+            'ylabel': 'Coefficient Value', 'tight_layout': True,
+        }
+        content = await chart_content(spec, coefficients, output)
+
+        headers = {"Content-Disposition": f"inline; filename=logistic_regression_coefficients_heart_disease_risk_factors.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        raise HTTPException(status_code=400, detail="Error generating the plot")
 
-        # Group by Sex and calculate heart disease prevalence
-        sex_heart_disease = fetchedData.groupby('Sex')['HeartDisease'].mean()
 
-        # Plot Sex vs. Heart Disease Prevalence
-        plt.figure(figsize=(8, 6))
-        sns.barplot(x=sex_heart_disease.index, y=sex_heart_disease.values, palette="coolwarm")
-        plt.title('Heart Disease Prevalence by Sex')
-        plt.xlabel('Sex')
-        plt.ylabel('Prevalence of Heart Disease')
-        plt.tight_layout()
+def model_info(model):
+    return {"model": model.name, "version": model.version[:12], "observations": model.nobs,
+            "converged": model.converged, "iterations": model.iterations, "warm_start": model.warm_start,
+            "fit_seconds": round(model.fit_seconds, 3)}
 
-        print("Plotting completed....")
 
-        # Save the plot to a BytesIO object
-        img_buffer = BytesIO()
-        plt.savefig(img_buffer, format='svg')
-        img_buffer.seek(0)
-        plt.close()
+@router.get("/model")
+async def heart_disease_model():
+    # Coefficients of the risk model behind the chart above, with standard errors and 95% intervals
+    try:
+        model = await model_cache.get(HEART_DISEASE_RISK)
+        return JSONResponse(
+            status_code=200,
+            content={**model_info(model), "coefficients": model.coefficients().to_dict(orient='records')},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        raise HTTPException(status_code=400, detail="Error fitting the model")
 
-        print("Image conversion done........")
 
-        headers = {"Content-Disposition": "inline; filename=sexVsHeart.svg"}
-        return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+@router.get("/model/predict")
+async def heart_disease_model_predict(
+    AgeCategory: str = Query(..., description="One of " + ", ".join(AGE_ORDER)),
+    BMI: float = Query(..., gt=0, lt=200),
+    Sex: str = Query(..., pattern="^(Male|Female)$"),
+):
+    if AgeCategory not in AGE_ORDER:
+        raise HTTPException(status_code=422, detail=f"AgeCategory must be one of {', '.join(AGE_ORDER)}")
+    try:
+        model = await model_cache.get(HEART_DISEASE_RISK)
+        X = heart_disease_features(pd.DataFrame({'AgeCategory': [AgeCategory], 'BMI': [BMI], 'Sex': [Sex]}))
+        probability, lower, upper = model.predict(X, interval=True)
+        return JSONResponse(
+            status_code=200,
+            content={"model": model.name, "version": model.version[:12], "probability": float(probability[0]),
+                     "ci_low": float(lower[0]), "ci_high": float(upper[0])},
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
-        raise HTTPException(status_code=400, detail="Error generating the plot")
+        raise HTTPException(status_code=400, detail="Error scoring with the model")
 
-@router.get("/Logistic_Regression_Coefficients_Heart_Disease_Risk_Factors")
-async def logistic_regression_coefficients_heart_disease_risk_factors():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+
+class RiskFeatures(BaseModel):
+    AgeCategory: Literal[tuple(AGE_ORDER)]
+    BMI: float = Field(gt=0, lt=200)
+    Sex: Literal['Male', 'Female']
+
+
+MAX_SCORE_ROWS = 10_000
+
+
+@router.post("/score")
+async def score_heart_disease_risk(patients: Union[RiskFeatures, List[RiskFeatures]]):
+    # Heart-disease probability for one feature vector, or a list of them scored in one matrix product
+    single = isinstance(patients, RiskFeatures)
+    rows = [patients] if single else patients
+    if len(rows) > MAX_SCORE_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_SCORE_ROWS} patients can be scored per request")
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-
-        print("Fetched data successfully")
-
-        df = pd.DataFrame(data)
-        df['HeartDisease'] = df['HeartDisease'].apply(lambda x: 1 if x == 'Yes' else 0)
-        df['Sex'] = df['Sex'].apply(lambda x: 1 if x == 'Male' else 0)
-
-        df['AgeCategory'] = df['AgeCategory'].map({
-            '18-24': 1, '25-29': 2, '30-34': 3, '35-39': 4, '40-44': 5,
-            '45-49': 6, '50-54': 7, '55-59': 8, '60-64': 9, '65-69': 10,
-            '70-74': 11, '75-79': 12, '80 or older': 13
-        })
-
-        X = df[['AgeCategory', 'BMI', 'Sex']]
-        X = sm.add_constant(X)
-
-        y = df['HeartDisease']
-        logit_model = sm.Logit(y, X).fit()
-        coefficients = pd.DataFrame(logit_model.params, columns=['Coefficient'])
-        plt.figure(figsize=(8, 6))
-        coefficients.plot(kind='bar', color='skyblue', legend=False)
-        plt.title('Logistic Regression Coefficients for Heart Disease Risk Factors')
-        plt.xlabel('Risk Factors')
-        plt.ylabel('Coefficient Value')
-        plt.tight_layout()
-
-        print("Plotting completed....")
-
-        # Save the plot to a BytesIO object
-        img_buffer = BytesIO()
-        plt.savefig(img_buffer, format='svg')
-        img_buffer.seek(0)
-        plt.close()
-
-        print("Image conversion done........")
-
-        headers = {"Content-Disposition": "inline; filename=logistic_regression_coefficients_heart_disease_risk_factors.svg"}
-        return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        model = await model_cache.get(HEART_DISEASE_RISK)
+        X = heart_disease_features(pd.DataFrame({
+            'AgeCategory': [row.AgeCategory for row in rows],
+            'BMI': [row.BMI for row in rows],
+            'Sex': [row.Sex for row in rows],
+        }))
+        probabilities = model.predict(X).tolist()
+        result = {"probability": probabilities[0]} if single else {"count": len(rows), "probabilities": probabilities}
+        return JSONResponse(status_code=200, content={"model": model.name, "version": model.version[:12], **result})
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
-        raise HTTPException(status_code=400, detail="Error generating the plot")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail="Error scoring with the model")
+
+
+@router.get("/bundle")
+async def bundle(request: Request, output: ChartOptions = Depends()):
+    # Every chart above in one ZIP
+    return await chart_bundle(router, request, output)
@@ -1,177 +1,117 @@
-print("HeartDisease has been reached")
-
-from fastapi import APIRouter, HTTPException, Response
-from io import BytesIO
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 import pandas as pd
-import seaborn as sns
-import matplotlib
-matplotlib.use('Agg')  # Use a non-interactive backend
-import matplotlib.pyplot as plt
-import httpx
+from app.services.aggregates import cube_cache
+from app.services.chartBundle import chart_bundle
+from app.services.chartCache import cached_chart
+from app.services.chartOutput import ChartOptions, chart_content
+from app.services.cohorts import Cohort
+from app.services.correlations import correlation_cache
+from app.services.datasetCache import HEART_DISEASE
 
 router = APIRouter()
 
 @router.get("/countDiseases")
-async def count_plot():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def count_plot(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-        else:
-            print("Fetched data successfully")
-            # Select relevant columns and melt the DataFrame
-            columns_of_interest = ['HeartDisease', 'Asthma', 'KidneyDisease', 'SkinCancer']
-            disease_data = fetchedData[columns_of_interest]
-            df_melted = disease_data.melt(id_vars='HeartDisease', value_vars=['Asthma', 'KidneyDisease', 'SkinCancer'],
-                                          var_name='Condition', value_name='Presence')
-            print("Starting to plot.........")
-            # Plotting
-            plt.figure(figsize=(10, 6))
-            sns.countplot(data=df_melted, x='Condition', hue='HeartDisease', dodge=True, palette='viridis')
-            plt.title('Count Plot of Asthma, Kidney Disease, and Skin Cancer by Heart Disease Status')
-            plt.xlabel('Condition')
-            plt.ylabel('Count')
-            plt.legend(title='Heart Disease', loc='upper right')
-            print("Plotting completed....")
-
-            # Save the plot to a BytesIO object
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='svg')
-            img_buffer.seek(0)
-            plt.close()
-
-            print("Image conversion done........")
-
-            headers = {"Content-Disposition": "inline; filename=countDiseases.svg"}
-            return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
-
+        cube = await cube_cache.get(HEART_DISEASE, cohort)
+
+        # Heart disease counts for each condition's rows, summed from the cube
+        conditions = ['Asthma', 'KidneyDisease', 'SkinCancer']
+        counts = pd.DataFrame([cube.counts(condition).sum().rename(condition) for condition in conditions])
+        counts = counts.rename_axis('Condition').stack().rename('Count').reset_index()
+        # Plotting
+        spec = {
+            'kind': 'bar', 'x': 'Condition', 'y': 'Count', 'hue': 'HeartDisease', 'palette': 'viridis',
+            'figsize': (10, 6),
+            'title': 'Count Plot of Asthma, Kidney Disease, and Skin Cancer by Heart Disease Status',
+            'xlabel': 'Condition', 'ylabel': 'Count',
+            'legend': {'title': 'Heart Disease', 'loc': 'upper right'},
+        }
+        content = await chart_content(spec, counts, output)
+
+        headers = {"Content-Disposition": f"inline; filename=countDiseases.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
 
 
 @router.get("/correlationHeatmap")
-async def correlation_heatmap():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def correlation_heatmap(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-        # filekey = 'heart_2020_cleaned.xlsx'
-        # fetchedData = S3Data(filekey)
-
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-        else:
-            columns_of_interest = ['HeartDisease', 'BMI', 'PhysicalHealth', 'MentalHealth', 'SleepTime']
-            df_corr = fetchedData[columns_of_interest]
-            df_corr['HeartDisease'] = df_corr['HeartDisease'].map({'Yes': 1, 'No': 0})
-            df_corr = df_corr.apply(pd.to_numeric, errors='coerce')
-
-            df_corr = df_corr.dropna()
-
-            corr_matrix = df_corr.corr()
-
-            plt.figure(figsize=(10, 6))
-            sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', linewidths=0.5, fmt=".2f")
-            plt.title('Correlation Heatmap for Heart Disease and Numerical Features')
-
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='svg')
-            img_buffer.seek(0)
-            plt.close()
-
-            headers = {"Content-Disposition": "inline; filename=correlationHeatmap.svg"}
-            return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        # From running sums kept per snapshot, not a DataFrame.corr() pass over every row
+        corr_matrix = await correlation_cache.correlation(HEART_DISEASE, cohort)
+
+        spec = {
+            'kind': 'heatmap', 'figsize': (10, 6),
+            'heatmap': {'annot': True, 'cmap': 'coolwarm', 'linewidths': 0.5, 'fmt': ".2f"},
+            'title': 'Correlation Heatmap for Heart Disease and Numerical Features',
+        }
+        content = await chart_content(spec, corr_matrix, output)
+
+        headers = {"Content-Disposition": f"inline; filename=correlationHeatmap.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
 
 @router.get("/diabeticHeart")
-async def diabeticHeart():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def diabeticHeart(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-        # filekey = 'heart_2020_cleaned.xlsx'
-        # fetchedData = S3Data(filekey)
-
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-        else:
-            plt.figure(figsize=(10, 6))
-            sns.countplot(data=fetchedData, x='Diabetic', hue='HeartDisease', palette='viridis', dodge=True)
-            plt.title('Count Plot of Diabetic Status Categorized by Heart Disease')
-            plt.xlabel('Diabetic Status')
-            plt.ylabel('Count')
-            plt.legend(title='Heart Disease', loc='upper right')
-
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='svg')
-            img_buffer.seek(0)
-            plt.close()
-
-            headers = {"Content-Disposition": "inline; filename=diabeticHeart.svg"}
-            return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        cube = await cube_cache.get(HEART_DISEASE, cohort)
+
+        counts = cube.count_table('Diabetic')
+        spec = {
+            'kind': 'bar', 'x': 'Diabetic', 'y': 'Count', 'hue': 'HeartDisease', 'palette': 'viridis',
+            'figsize': (10, 6),
+            'title': 'Count Plot of Diabetic Status Categorized by Heart Disease',
+            'xlabel': 'Diabetic Status', 'ylabel': 'Count',
+            'legend': {'title': 'Heart Disease', 'loc': 'upper right'},
+        }
+        content = await chart_content(spec, counts, output)
+
+        headers = {"Content-Disposition": f"inline; filename=diabeticHeart.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
 
 @router.get("/strokeHeart")
-async def strokeHeart():
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getHeart_disease_analysis"
+@cached_chart(HEART_DISEASE)
+async def strokeHeart(cohort: Cohort, output: ChartOptions = Depends()):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
-        # filekey = 'heart_2020_cleaned.xlsx'
-        # fetchedData = S3Data(filekey)
-
-        fetchedData = pd.DataFrame(data)
-
-        if isinstance(fetchedData, dict) and 'error' in fetchedData:
-            raise HTTPException(status_code=500, detail=fetchedData['error'])
-        else:
-            plt.figure(figsize=(10, 6))
-            sns.countplot(data=fetchedData, x='Stroke', hue='HeartDisease', palette='viridis', dodge=True)
-            plt.title('Count Plot of Stroke Categorized by Heart Disease')
-            plt.xlabel('Stroke History')
-            plt.ylabel('Count')
-            plt.legend(title='Heart Disease', loc='upper right')
-
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='svg')
-            img_buffer.seek(0)
-            plt.close()
-
-            headers = {"Content-Disposition": "inline; filename=strokeHeart.svg"}
-            return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        cube = await cube_cache.get(HEART_DISEASE, cohort)
+
+        counts = cube.count_table('Stroke')
+        spec = {
+            'kind': 'bar', 'x': 'Stroke', 'y': 'Count', 'hue': 'HeartDisease', 'palette': 'viridis',
+            'figsize': (10, 6),
+            'title': 'Count Plot of Stroke Categorized by Heart Disease',
+            'xlabel': 'Stroke History', 'ylabel': 'Count',
+            'legend': {'title': 'Heart Disease', 'loc': 'upper right'},
+        }
+        content = await chart_content(spec, counts, output)
+
+        headers = {"Content-Disposition": f"inline; filename=strokeHeart.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
 
 
-
-
-
-
-
-
-
-
-
+@router.get("/bundle")
+async def bundle(request: Request, output: ChartOptions = Depends()):
+    # Every chart above in one ZIP
+    return await chart_bundle(router, request, output)
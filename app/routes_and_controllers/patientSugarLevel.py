@@ -1,14 +1,24 @@
-from fastapi import APIRouter, HTTPException, Response
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi.responses import JSONResponse
-from io import BytesIO
+import numpy as np
 import pandas as pd
 import httpx
-import matplotlib
-matplotlib.use('Agg')  # Use a non-interactive backend
-import matplotlib.pyplot as plt
+from app.services.chartCache import cached_chart
+from app.services.chartOutput import ChartOptions, chart_content
+from app.services.datasetCache import PATIENTS, BLOOD_SUGAR
+from app.services.patientIndex import patient_index
 
 router = APIRouter()
 
+CHOLESTEROL_BINS = [-np.inf, 200, 240, np.inf]
+CHOLESTEROL_LABELS = ['Normal', 'Borderline High', 'High']
+BMI_BINS = [-np.inf, 18.5, 25, 30, np.inf]
+BMI_LABELS = ["Underweight", "Normal weight", "Overweight", "Obese"]
+MAX_BATCH_IDS = 1000
+
+# calculate_bmi is plain arithmetic, so it works on scalars and whole columns alike
 def calculate_bmi(weight, height):
     return weight / (height ** 2)
 
@@ -25,50 +35,72 @@ def get_cholesterol_status(cholesterol):
 def get_bmi_category(bmi):
     if bmi < 18.5:
         return "Underweight"
-    elif 18.5 <= bmi < 24.9:
+    elif 18.5 <= bmi < 25:
         return "Normal weight"
-    elif 25 <= bmi < 29.9:
+    elif 25 <= bmi < 30:
         return "Overweight"
     else:
         return "Obese"
 
+# Column-at-a-time versions of the helpers above, for the batch endpoint
+def get_cholesterol_statuses(cholesterol):
+    status = pd.cut(cholesterol, CHOLESTEROL_BINS, labels=CHOLESTEROL_LABELS, right=False).astype(object)
+    return status.mask(cholesterol == 0, 'No data')
+
+def get_bmi_categories(bmi):
+    return pd.cut(bmi, BMI_BINS, labels=BMI_LABELS, right=False).astype(object)
+
+def patient_summaries(patients):
+    # The per-patient fields of get_patient_details, computed for every row of patients at once
+    height = patients['height'].astype('float64') / 100.0  # Convert to meters
+    weight = np.trunc(patients['weight'].astype('float64'))
+    bmi = calculate_bmi(weight, height)
+    cholesterol = patients['serum_cholesterol'].astype('float64')
+    summaries = pd.DataFrame({
+        "id": patients['id'],
+        "Name": patients['FName'].astype(str) + " " + patients['LName'].astype(str),
+        "Age": patients['age'].astype('Int64'),
+        "Gender": patients['gender'].astype(object),
+        "Height (cm)": (height * 100).round(1),
+        "Weight (kg)": weight.astype('Int64'),
+        "Blood Group": patients['BloodGroup'].astype(object),
+        "BMI": bmi.round(2),
+        "BMI Category": get_bmi_categories(bmi),
+        "Serum Cholesterol": cholesterol.astype('Int64'),
+        "Cholesterol Status": get_cholesterol_statuses(cholesterol),
+        "Blood Sugar Status": np.where(patients['fastingbloodsugar'] == 1, 'Diabetic', 'Non-Diabetic'),
+    })
+    # Missing values as JSON null rather than NaN
+    summaries = summaries.astype(object).where(summaries.notna(), None)
+    return summaries.to_dict(orient='records')
+
 @router.get("/patient/{patient_id}/sugar-levels")
 async def get_patient_details(patient_id: int):
-    print("At least you have entered the patientSugarLevel route")
-    patient_database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getPatients_analysis"
-    sugar_report_database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getBlood_sugar_analysis"
-
     try:
-        # Fetch data from APIs
-        async with httpx.AsyncClient() as client:
-            patient_response = await client.post(patient_database)
-            sugar_report_response = await client.post(sugar_report_database)
-            patient_response.raise_for_status()
-            sugar_report_response.raise_for_status()
-            patient_data = pd.DataFrame(patient_response.json())
-            blood_sugar_data = pd.DataFrame(sugar_report_response.json())
+        # Look the patient up in the indexed snapshots instead of scanning a copy of each table
+        (patients, patient_ids), (blood_sugar, _) = await asyncio.gather(
+            patient_index.get(PATIENTS), patient_index.get(BLOOD_SUGAR))
 
         # Validate patient data
-        if patient_data.empty:
+        if patients.frame.empty:
             raise HTTPException(status_code=500, detail="Patient data is empty.")
-        if blood_sugar_data.empty:
+        if blood_sugar.frame.empty:
             raise HTTPException(status_code=500, detail="Blood sugar data is empty.")
 
-        # Filter patient data
-        patient_detail = patient_data[patient_data['id'] == patient_id]
-        if patient_detail.empty:
+        patient_detail = patient_ids.row(patients.frame, patient_id)
+        if patient_detail is None:
             raise HTTPException(status_code=404, detail=f"Patient with ID {patient_id} not found.")
 
         # Extract patient details
-        first_name = patient_detail['FName'].values[0]
-        last_name = patient_detail['LName'].values[0]
-        age = int(patient_detail['age'].values[0])
-        gender = patient_detail['gender'].values[0]
-        height = patient_detail['height'].values[0] / 100.0  # Convert to meters
-        weight = int(patient_detail['weight'].values[0])
-        blood_group = patient_detail['BloodGroup'].values[0]
-        serum_choles = int(patient_detail['serum_cholesterol'].values[0])
-        blood_sugar = int(patient_detail['fastingbloodsugar'].values[0])
+        first_name = patient_detail['FName']
+        last_name = patient_detail['LName']
+        age = int(patient_detail['age'])
+        gender = patient_detail['gender']
+        height = float(patient_detail['height']) / 100.0  # Convert to meters
+        weight = int(patient_detail['weight'])
+        blood_group = patient_detail['BloodGroup']
+        serum_choles = int(patient_detail['serum_cholesterol'])
+        blood_sugar = int(patient_detail['fastingbloodsugar'])
 
         # Calculate BMI and other details
         bmi = calculate_bmi(weight, height)
@@ -94,6 +126,8 @@ async def get_patient_details(patient_id: int):
             },
         )
 
+    except HTTPException:
+        raise
     except httpx.HTTPStatusError as e:
         print(f"HTTP error: {e}")
         raise HTTPException(status_code=400, detail=f"HTTP error: {e}")
@@ -104,50 +138,99 @@ async def get_patient_details(patient_id: int):
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the patient details.")
 
-@router.get("/patient/{patient_id}/monthlySugarReport")
-async def monthlySugarReport(patient_id: int):
-    database = "https://e-react-node-backend-22ed6864d5f3.herokuapp.com/getBlood_sugar_analysis"
+@router.get("/patients/sugar-levels")
+async def get_patients_details(
+    ids: Optional[List[int]] = Query(None),
+    gender: Optional[str] = None,
+    blood_group: Optional[str] = None,
+    min_age: Optional[int] = None,
+    max_age: Optional[int] = None,
+    diabetic: Optional[bool] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_BATCH_IDS),
+):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(database)
-            response.raise_for_status()
-            data = response.json()
+        patients, patient_ids = await patient_index.get(PATIENTS)
+        frame = patients.frame
+        missing = []
+
+        if ids:
+            # Explicit ids: one index lookup each, answered in the order they were asked for
+            if len(ids) > MAX_BATCH_IDS:
+                raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request.")
+            offsets = [patient_ids.offsets.get(patient_id) for patient_id in ids]
+            missing = [patient_id for patient_id, row in zip(ids, offsets) if row is None]
+            cohort = frame.iloc[[row for row in offsets if row is not None]]
+        else:
+            # Cohort filter: one vectorized mask over the snapshot, then a page of it by id
+            keep = np.ones(len(frame), dtype=bool)
+            if gender is not None:
+                keep &= (frame['gender'] == gender).to_numpy()
+            if blood_group is not None:
+                keep &= (frame['BloodGroup'] == blood_group).to_numpy()
+            if min_age is not None:
+                keep &= (frame['age'] >= min_age).to_numpy()
+            if max_age is not None:
+                keep &= (frame['age'] <= max_age).to_numpy()
+            if diabetic is not None:
+                keep &= ((frame['fastingbloodsugar'] == 1) == diabetic).to_numpy()
+            cohort = frame[keep].sort_values('id')
+
+        total = len(cohort)
+        page = cohort if ids else cohort.iloc[offset:offset + limit]
 
-        blood_sugar_data = pd.DataFrame(data)
+        return JSONResponse(
+            status_code=200,
+            content={
+                "total": total,
+                "offset": 0 if ids else offset,
+                "limit": len(ids) if ids else limit,
+                "missing": missing,
+                "patients": patient_summaries(page),
+            },
+        )
+
+    except HTTPException:
+        raise
+    except httpx.HTTPStatusError as e:
+        print(f"HTTP error: {e}")
+        raise HTTPException(status_code=400, detail=f"HTTP error: {e}")
+    except httpx.RequestError as e:
+        print(f"Request error: {e}")
+        raise HTTPException(status_code=400, detail=f"Request error: {e}")
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        raise HTTPException(status_code=400, detail="Error generating the patient details.")
 
-        if isinstance(blood_sugar_data, dict) and 'error' in blood_sugar_data:
-            raise HTTPException(status_code=500, detail=blood_sugar_data['error'])
+@router.get("/patient/{patient_id}/monthlySugarReport")
+@cached_chart(BLOOD_SUGAR)
+async def monthlySugarReport(patient_id: int, output: ChartOptions = Depends()):
+    try:
+        patient_data = await patient_index.lookup(BLOOD_SUGAR, patient_id)
 
         # Check if patient data exists
-        if patient_id not in blood_sugar_data["id"].values:
+        if patient_data is None:
             raise HTTPException(status_code=404, detail=f"No data found for Patient ID: {patient_id}")
 
-        # Filter data for the patient
-        patient_data = blood_sugar_data[blood_sugar_data["id"] == patient_id]
-        patient_data = patient_data.set_index("id")
-
         # Extract months and values for plotting
-        time_points = list(patient_data.columns)
-        blood_sugar_levels = patient_data.loc[patient_id].values
+        patient_data = patient_data.drop("id")
+        time_points = list(patient_data.index)
+        blood_sugar_levels = patient_data.values
 
         # Plotting
-        plt.figure(figsize=(10, 5))
-        plt.plot(time_points, blood_sugar_levels, marker='o', linestyle='-', color='b')
-        plt.title(f'Blood Sugar Level vs Time for Patient {patient_id}')
-        plt.xlabel('Time')
-        plt.ylabel('Blood Sugar Level (mg/dL)')
-        plt.xticks(rotation=45)
-        plt.grid(True)
-        plt.tight_layout()
-
-        # Save the plot to a BytesIO object
-        img_buffer = BytesIO()
-        plt.savefig(img_buffer, format='svg')
-        img_buffer.seek(0)
-        plt.close()
-
-        headers = {"Content-Disposition": "inline; filename=monthlysugarreport.svg"}
-        return Response(content=img_buffer.getvalue(), media_type="image/svg+xml", headers=headers, status_code=200)
+        spec = {
+            'kind': 'line', 'x': 'Time', 'y': 'Blood Sugar Level', 'marker': 'o', 'linestyle': '-', 'color': 'b',
+            'grid': True, 'figsize': (10, 5),
+            'title': f'Blood Sugar Level vs Time for Patient {patient_id}', 'xlabel': 'Time',
+            'ylabel': 'Blood Sugar Level (mg/dL)', 'xticks_rotation': 45, 'tight_layout': True,
+        }
+        series = pd.DataFrame({'Time': time_points, 'Blood Sugar Level': blood_sugar_levels})
+        content = await chart_content(spec, series, output)
+
+        headers = {"Content-Disposition": f"inline; filename=monthlysugarreport.{output.format.extension}"}
+        return Response(content=content, media_type=output.format.media_type, headers=headers, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
         raise HTTPException(status_code=400, detail="Error generating the plot")
\ No newline at end of file
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from app.services.metrics import metrics
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def service_metrics():
+    # Prometheus text exposition format
+    return Response(content=metrics.exposition(), media_type="text/plain; version=0.0.4; charset=utf-8",
+                    status_code=200)
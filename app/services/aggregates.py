@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+from app.services.cohorts import cohort_index, popcount
+from app.services.datasetCache import dataset_cache, HEART_DISEASE
+from app.services.metrics import cache_lookup, stage
+from app.services.schemas import DERIVED_COLUMNS
+
+
+class CrossTabCube:
+    # Counts of every categorical dimension against one target column, computed together
+    # from a dataset snapshot. Charts read these few-row tables instead of the raw frame.
+    def __init__(self, target, tables, version=None):
+        self.target = target
+        self.tables = tables
+        self.version = version
+
+    @classmethod
+    def build(cls, frame, target, derived=None, max_levels=50, version=None):
+        columns = {name: frame[name] for name in frame.columns if name != target}
+        for name, derive in (derived or {}).items():
+            columns[name] = pd.Series(derive(frame), index=frame.index)
+
+        target_codes, target_levels = pd.factorize(frame[target], sort=True)
+        width = len(target_levels)
+        tables = {}
+        for name, column in columns.items():
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                codes, levels = column.cat.codes.to_numpy(), column.cat.categories
+            elif column.dtype == object:
+                codes, levels = pd.factorize(column, sort=True)
+            else:
+                continue
+            if len(levels) > max_levels:
+                continue
+            # One bincount per dimension over (level, target) pairs gives the whole cross-tab
+            valid = (codes >= 0) & (target_codes >= 0)
+            flat = np.bincount(codes[valid] * width + target_codes[valid], minlength=len(levels) * width)
+            tables[name] = pd.DataFrame(flat.reshape(len(levels), width),
+                                        index=pd.Index(levels, name=name),
+                                        columns=pd.Index(target_levels, name=target))
+        return cls(target, tables, version)
+
+    def merge(self, other, max_levels=50, version=None):
+        # Counts of two sets of rows add; a level seen on only one side counts zero on the other
+        tables = {}
+        for name in self.tables.keys() & other.tables.keys():
+            table = self.tables[name].add(other.tables[name], fill_value=0).astype('int64')
+            if len(table) <= max_levels:
+                tables[name] = table.rename_axis(index=name, columns=self.target)
+        return CrossTabCube(self.target, tables, version)
+
+    def within(self, index, bits):
+        # The same tables counted over a cohort's rows only: each cell is the popcount of the
+        # cohort's bitmap ANDed with its target level's and its dimension level's, no pass over rows
+        in_target = {level: bits & target for level, target in (index.bitmaps.get(self.target) or {}).items()}
+        tables = {}
+        for name, table in self.tables.items():
+            counts = np.zeros(table.shape, dtype='int64')
+            for j, target in enumerate(table.columns):
+                for i, level in enumerate(table.index):
+                    rows = index.bitmap(name, level)
+                    if rows is not None and str(target) in in_target:
+                        counts[i, j] = popcount(in_target[str(target)] & rows)
+            tables[name] = pd.DataFrame(counts, index=table.index, columns=table.columns)
+        return CrossTabCube(self.target, tables, self.version)
+
+    def counts(self, dimension, order=None):
+        table = self.tables[dimension]
+        return table if order is None else table.reindex(order, fill_value=0)
+
+    def count_table(self, dimension, level=None, order=None):
+        # Long (dimension, target, Count) rows, or (dimension, Count) for one target level
+        table = self.counts(dimension, order)
+        if level is not None:
+            return table[level].rename('Count').reset_index()
+        return table.stack().rename('Count').reset_index()
+
+    def prevalence(self, dimension, positive='Yes', order=None):
+        table = self.counts(dimension, order)
+        return (table[positive] / table.sum(axis=1)).rename(self.target)
+
+    def prevalence_table(self, dimension, positive='Yes', order=None):
+        # Prevalence per category plus a normal-approximation 95% interval
+        table = self.counts(dimension, order)
+        total = table.sum(axis=1)
+        rate = table[positive] / total
+        stderr = np.sqrt(rate * (1 - rate) / total.clip(lower=1))
+        return pd.DataFrame({dimension: table.index, 'Prevalence': rate.to_numpy(), 'Error': (1.96 * stderr).to_numpy()})
+
+
+# How each dataset is cubed: which column every dimension is crossed with, plus derived dimensions.
+# The cohort index covers the same derived columns, so a filtered cube is counted from its bitmaps.
+CUBES = {
+    HEART_DISEASE: {'target': 'HeartDisease', 'derived': DERIVED_COLUMNS[HEART_DISEASE]},
+}
+
+
+class CubeCache:
+    # One cube per dataset snapshot, rebuilt only when the dataset version changes (and then
+    # only from the new rows when the snapshot was appended to)
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self._cubes = {}
+
+    async def get(self, endpoint, cohort=None):
+        if cohort:
+            # Counted per request from the snapshot's cube and cohort index; the chart cache keeps the chart
+            _, index, bits = await cohort_index.select(endpoint, cohort)
+            if bits is not None:
+                cube = await self.get(endpoint)
+                with stage("transform"):
+                    return cube.within(index, bits)
+        entry = await self.datasets.get(endpoint)
+        cube = self._cubes.get(endpoint)
+        if cube is not None and cube.version == entry.version:
+            cache_lookup("cube", "hit")
+            return cube
+        with stage("transform"):
+            if cube is not None and entry.base_version == cube.version:
+                # Only rows were appended since this cube: count the new ones and add them in
+                cache_lookup("cube", "update")
+                cube = cube.merge(CrossTabCube.build(entry.appended, **CUBES[endpoint]), version=entry.version)
+            else:
+                cache_lookup("cube", "miss")
+                cube = CrossTabCube.build(entry.frame, version=entry.version, **CUBES[endpoint])
+        self._cubes[endpoint] = cube
+        return cube
+
+
+cube_cache = CubeCache(dataset_cache)
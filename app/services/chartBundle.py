@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import io
+import json
+import mimetypes
+import zipfile
+from dataclasses import fields
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request, Response
+from starlette.routing import Route
+
+from app.services.chartCache import etag_matches
+from app.services.chartOutput import ChartOptions
+
+
+def bundle_charts(router):
+    # Every chart route of a router that needs no path parameters, in declaration order
+    return [route for route in router.routes
+            if isinstance(route, Route) and "GET" in (route.methods or ())
+            and hasattr(route.endpoint, "chart_datasets") and not route.param_convertors]
+
+
+def _chart_request(request, path, output):
+    # A GET for one chart route as a client would send it, so it shares that request's chart
+    # cache entry, but without the bundle's conditional headers so the cache returns the body.
+    # Cohort filters on the bundle apply to every chart in it.
+    options = {option.name for option in fields(ChartOptions)}
+    filters = urlencode([(name, value) for name, value in request.query_params.multi_items() if name not in options])
+    query_string = "&".join(part for part in (output.query_string, filters) if part)
+    scope = {key: value for key, value in request.scope.items()
+             if key not in ("route", "endpoint", "path_params")}
+    scope.update(path=path, raw_path=path.encode(), query_string=query_string.encode(), headers=[],
+                 path_params={})
+    return Request(scope)
+
+
+def _filename(route, response):
+    extension = mimetypes.guess_extension(response.media_type or "") or ".bin"
+    return route.path.strip("/").replace("/", "_") + extension
+
+
+async def _render(route, request, prefix, output):
+    try:
+        response = await route.endpoint(request=_chart_request(request, prefix + route.path, output), output=output)
+        return route, response, None
+    except HTTPException as e:
+        return route, None, e
+
+
+async def chart_bundle(router, request, output, suffix="/bundle"):
+    # Renders all of a router's charts concurrently and returns them as one ZIP. The dataset
+    # cache's single-flight means the charts share one snapshot and at most one upstream fetch,
+    # and the chart cache means a bundle after individual chart hits (or vice versa) re-renders nothing.
+    prefix = request.url.path[:-len(suffix)]
+    results = await asyncio.gather(*(_render(route, request, prefix, output) for route in bundle_charts(router)))
+
+    manifest, files, errors = [], [], []
+    for route, response, error in results:
+        if response is None or response.status_code != 200:
+            errors.append(error)
+            manifest.append({"path": prefix + route.path,
+                             "error": error.detail if error is not None else response.status_code})
+            continue
+        filename = _filename(route, response)
+        manifest.append({"path": prefix + route.path, "file": filename, "etag": response.headers.get("etag")})
+        files.append((filename, response.body))
+
+    if not files:
+        # Nothing rendered: surface the charts' own error, e.g. the render pool's 503 + Retry-After
+        error = next((error for error in errors if error is not None), None)
+        raise error or HTTPException(status_code=400, detail="Error generating the bundle")
+
+    # The bundle changes exactly when one of its charts does
+    etag = '"' + hashlib.sha256("\n".join(str(item) for item in manifest).encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache",
+               "Content-Disposition": f"attachment; filename={prefix.strip('/') or 'charts'}.zip"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in files:
+            archive.writestr(filename, content)
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    return Response(content=buffer.getvalue(), media_type="application/zip", headers=headers, status_code=200)
@@ -0,0 +1,229 @@
+import asyncio
+import functools
+import gzip
+import hashlib
+import inspect
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
+
+import brotli
+import httpx
+from fastapi import HTTPException, Request, Response
+
+from app import config
+from app.services.chartOutput import ChartOptions
+from app.services.cohorts import Cohort
+from app.services.datasetCache import dataset_cache
+from app.services.metrics import cache_lookup, stage
+
+
+# Text payloads worth compressing; PNG/WebP are already compressed
+COMPRESSIBLE_TYPES = {"image/svg+xml", "application/json", "application/vnd.apache.arrow.stream"}
+
+
+def compress(content, media_type):
+    # Each encoding is computed once, when the chart is cached, and served for every later hit
+    if media_type not in COMPRESSIBLE_TYPES:
+        return {}
+    return {"br": brotli.compress(content, quality=9), "gzip": gzip.compress(content, compresslevel=6, mtime=0)}
+
+
+@dataclass
+class CachedChart:
+    content: bytes
+    media_type: str
+    etag: str
+    headers: dict
+    encoded: dict = field(default_factory=dict)
+
+    @property
+    def nbytes(self):
+        return len(self.content) + sum(len(body) for body in self.encoded.values())
+
+
+class InflightRender:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class ChartCache:
+    # LRU over rendered payloads, bounded both by entry count and by total bytes
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    def get(self, key):
+        chart = self._entries.get(key)
+        if chart is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return chart
+
+    def put(self, key, chart):
+        if chart.nbytes > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= previous.nbytes
+        self._entries[key] = chart
+        self.size += chart.nbytes
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.nbytes
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    async def coalesce(self, key, render):
+        # Single-flight per key: identical requests arriving while a chart renders await that one
+        # render and all get its result, or its error. The render belongs to no single request:
+        # one whose client disconnects just stops waiting, and it is only cancelled once nobody is.
+        flight = self._inflight.get(key)
+        if flight is None:
+            cache_lookup("chart", "miss")
+            flight = self._inflight[key] = InflightRender(asyncio.ensure_future(render()))
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+        else:
+            cache_lookup("chart", "coalesced")
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Forget the flight now rather than when the cancelled task lands, so a request
+                # arriving in between starts a render of its own instead of joining this one
+                self._land(key, flight)
+                flight.task.cancel()
+
+    def _land(self, key, flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+
+chart_cache = ChartCache(config.CHART_CACHE_MAX_ENTRIES, config.CHART_CACHE_MAX_BYTES)
+
+
+def chart_key(request, versions):
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    raw = "\n".join([request.url.path, params, *versions])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison, so a W/ prefix added by a proxy still matches
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def accepted_encoding(request, available):
+    # Brotli over gzip when the client takes both; anything with q=0 is refused
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.strip().lower())
+    return next((encoding for encoding in ("br", "gzip") if encoding in available and encoding in accepted), None)
+
+
+def chart_response(request, chart):
+    headers = dict(chart.headers)
+    encoding = accepted_encoding(request, chart.encoded)
+    content, etag = chart.content, chart.etag
+    if encoding is not None:
+        # Each representation gets its own ETag, as the bytes differ
+        content, etag = chart.encoded[encoding], chart.etag[:-1] + "-" + encoding + '"'
+        headers["Content-Encoding"] = encoding
+    if chart.encoded:
+        headers["Vary"] = "Accept-Encoding"
+    headers["ETag"] = etag
+    headers["Cache-Control"] = "no-cache"
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type=chart.media_type, headers=headers, status_code=200)
+
+
+async def render_chart(handler, kwargs, key):
+    # Calls the handler and caches its chart; a response other than a 200 is returned as is.
+    # Handler time not timed as a stage of its own is shaping the data, so it counts as transform.
+    with stage("transform"):
+        response = await handler(**kwargs)
+    if response.status_code != 200:
+        return response
+    headers = {"Content-Disposition": response.headers["content-disposition"]} \
+        if "content-disposition" in response.headers else {}
+    with stage("compress"):
+        encoded = compress(response.body, response.media_type)
+    chart = CachedChart(
+        content=response.body,
+        media_type=response.media_type,
+        etag='"' + hashlib.sha256(response.body).hexdigest() + '"',
+        headers=headers,
+        encoded=encoded,
+    )
+    chart_cache.put(key, chart)
+    return chart
+
+
+def cached_chart(*endpoints):
+    # Caches a chart route's rendered bytes per (path, query, dataset versions) and answers
+    # If-None-Match with 304. The wrapped handler is only called on a miss, and concurrent
+    # identical misses share one call. A handler with a cohort parameter is passed the request's
+    # other query parameters as row filters (Sex=Female&Diabetic=Yes); the query is part of the
+    # key, so each cohort's chart is cached on its own.
+    def decorator(handler):
+        signature = inspect.signature(handler)
+        takes_cohort = "cohort" in signature.parameters
+        # Query parameters the route declares itself are never filters
+        reserved = {option.name for option in fields(ChartOptions)} | set(signature.parameters)
+
+        @functools.wraps(handler)
+        async def wrapper(request: Request, **kwargs):
+            # The datasets load before the handler's own try, so their failures get the same 400s here
+            try:
+                entries = await asyncio.gather(*(dataset_cache.get(endpoint) for endpoint in endpoints))
+            except HTTPException:
+                raise
+            except httpx.HTTPStatusError as e:
+                raise HTTPException(status_code=400, detail=f"HTTP error: {e}")
+            except httpx.RequestError as e:
+                raise HTTPException(status_code=400, detail=f"Request error: {e}")
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Error loading the chart data: {e}")
+            versions = [entry.version for entry in entries]
+            key = chart_key(request, versions)
+            if takes_cohort:
+                kwargs["cohort"] = Cohort.from_query(request.query_params, exclude=reserved)
+
+            chart = chart_cache.get(key)
+            if chart is None:
+                chart = await chart_cache.coalesce(key, lambda: render_chart(handler, kwargs, key))
+                if not isinstance(chart, CachedChart):
+                    return chart
+            else:
+                cache_lookup("chart", "hit")
+            return chart_response(request, chart)
+
+        # Marks the route as a chart for bundles, and records which datasets it is drawn from
+        wrapper.chart_datasets = endpoints
+        # Expose the Request to FastAPI alongside the handler's own parameters, except the cohort
+        # the wrapper fills in
+        request_param = inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+        params = [p.replace(kind=inspect.Parameter.KEYWORD_ONLY) for p in signature.parameters.values()
+                  if p.name != "cohort"]
+        wrapper.__signature__ = signature.replace(parameters=[request_param, *params])
+        return wrapper
+
+    return decorator
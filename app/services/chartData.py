@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import gaussian_kde
+
+# Helpers that reduce a full dataset to the small tables the chart renderer draws.
+# They run in the API process so only a few hundred bytes cross into the render pool.
+
+
+def count_table(frame, x, hue=None):
+    keys = [x] if hue is None else [x, hue]
+    return frame.groupby(keys, observed=False, sort=True).size().reset_index(name='Count')
+
+
+def _box_stats(values):
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return None
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    outside = values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)]
+    return {
+        'med': med, 'q1': q1, 'q3': q3,
+        'whislo': inside.min(), 'whishi': inside.max(),
+        # Identical outliers draw on top of each other, so one marker per distinct value is enough
+        'fliers': np.unique(outside).tolist(),
+    }
+
+
+def box_table(frame, x, y, hue=None):
+    keys = [x] if hue is None else [x, hue]
+    rows = []
+    for key, group in frame.groupby(keys, observed=True, sort=True):
+        stats = _box_stats(group[y])
+        if stats is None:
+            continue
+        key = key if isinstance(key, tuple) else (key,)
+        rows.append(dict(zip(keys, key), **stats))
+    return pd.DataFrame(rows)
+
+
+def histogram_table(frame, x, hue, gridsize=200):
+    # Stacked histogram bins per hue level plus a KDE curve scaled to counts, like histplot(kde=True)
+    values = pd.to_numeric(frame[x], errors='coerce')
+    valid = values.notna()
+    values, levels = values[valid], frame.loc[valid, hue]
+    edges = np.histogram_bin_edges(values.to_numpy(), bins='auto')
+    width = edges[1] - edges[0]
+    grid = np.linspace(edges[0], edges[-1], gridsize)
+
+    bins, curves = [], []
+    for level in sorted(levels.unique()):
+        subset = values[levels == level]
+        counts, _ = np.histogram(subset.to_numpy(), bins=edges)
+        bins.append(pd.DataFrame({'left': edges[:-1], 'width': width, 'count': counts, hue: level}))
+        if subset.nunique() > 1:
+            # KDE over distinct values weighted by frequency: same estimate as over every row, at a fraction of the cost
+            distinct = subset.value_counts()
+            kde = gaussian_kde(distinct.index.to_numpy(dtype=float), weights=distinct.to_numpy(dtype=float),
+                               bw_method=len(subset) ** -0.2)
+            density = kde(grid) * len(subset) * width
+        else:
+            density = np.zeros_like(grid)
+        curves.append(pd.DataFrame({'x': grid, 'density': density, hue: level}))
+    return {'bins': pd.concat(bins, ignore_index=True), 'kde': pd.concat(curves, ignore_index=True)}
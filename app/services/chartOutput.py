@@ -0,0 +1,97 @@
+import io
+import mimetypes
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+
+import orjson
+import pandas as pd
+import pyarrow as pa
+from fastapi import Query
+
+from app.services.metrics import stage
+from app.services.renderPool import render_pool
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+mimetypes.add_type(ARROW_MEDIA_TYPE, ".arrows")
+mimetypes.add_type("image/webp", ".webp")
+
+
+class ChartFormat(str, Enum):
+    # svg/png/webp are rendered by the render pool; json/arrow return the aggregated data the
+    # chart is drawn from, for clients that draw it themselves, and never touch matplotlib
+    svg = "svg"
+    png = "png"
+    webp = "webp"
+    json = "json"
+    arrow = "arrow"
+
+    @property
+    def media_type(self):
+        return {"svg": "image/svg+xml", "png": "image/png", "webp": "image/webp", "json": "application/json",
+                "arrow": ARROW_MEDIA_TYPE}[self.value]
+
+    @property
+    def raster(self):
+        return self in (ChartFormat.png, ChartFormat.webp)
+
+    @property
+    def extension(self):
+        return "arrows" if self is ChartFormat.arrow else self.value
+
+
+@dataclass
+class ChartOptions:
+    # Query parameters shared by every chart route; width (pixels) and dpi apply to png/webp
+    format: ChartFormat = ChartFormat.svg
+    width: Optional[int] = Query(None, ge=100, le=4000)
+    dpi: Optional[int] = Query(None, ge=50, le=300)
+
+    @property
+    def query_string(self):
+        params = [] if self.format is ChartFormat.svg else [f"format={self.format.value}"]
+        params += [f"{name}={value}" for name, value in (("width", self.width), ("dpi", self.dpi)) if value]
+        return "&".join(params)
+
+
+def _table(frame):
+    # Row labels (a correlation matrix's variable names, say) become an ordinary column
+    return frame if isinstance(frame.index, pd.RangeIndex) else frame.reset_index()
+
+
+def _records(frame):
+    return _table(frame).to_dict(orient='records')
+
+
+def to_json(spec, data):
+    series = {name: _records(frame) for name, frame in data.items()} if isinstance(data, dict) else _records(data)
+    return orjson.dumps({"chart": spec, "data": series}, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def to_arrow(spec, data):
+    if isinstance(data, dict):
+        # One stream holds one table, so multi-part data is stacked with a "series" column naming each part
+        frame = pd.concat({name: _table(part) for name, part in data.items()}, names=["series"])
+        frame = frame.reset_index(level=0).reset_index(drop=True)
+    else:
+        frame = _table(data)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    # The chart spec (kind, axes, titles) rides along as schema metadata
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"chart": orjson.dumps(spec)})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+async def chart_content(spec, data, options):
+    if options.format is ChartFormat.json:
+        with stage("serialize"):
+            return to_json(spec, data)
+    if options.format is ChartFormat.arrow:
+        with stage("serialize"):
+            return to_arrow(spec, data)
+    with stage("render"):
+        if options.format.raster:
+            return await render_pool.render(spec, data, options.format.value, options.width, options.dpi)
+        return await render_pool.render(spec, data, options.format.value)
@@ -0,0 +1,132 @@
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import httpx
+import pandas as pd
+from fastapi import Depends, HTTPException, Response
+
+from app.services.chartCache import cached_chart
+from app.services.chartOutput import ChartOptions, chart_content
+from app.services.cohorts import Cohort, cohort_index
+from app.services.datasetCache import dataset_cache
+from app.services.metrics import cache_lookup, stage
+from app.services.schemas import append_rows
+
+
+@dataclass(frozen=True, eq=False)
+class Chart:
+    # One chart as data: the dataset it is drawn from, the columns it derives from that dataset's
+    # rows, how the rows are aggregated into the table that is plotted, and the render spec
+    path: str
+    name: str
+    filename: str
+    dataset: str
+    plot: dict
+    aggregate: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None
+    # column -> function of the frame; charts that derive the same column share one function
+    derived: dict = field(default_factory=dict)
+    # Instead of aggregate: async (cohort) -> table, for a chart drawn from a cache of its own that
+    # keeps the table up to date incrementally (the correlation cache, say)
+    source: Optional[Callable] = None
+
+
+@dataclass(frozen=True)
+class PreparedFrame:
+    frame: pd.DataFrame
+    version: str
+
+
+class ChartRegistry:
+    # Charts registered per dataset, drawn from one prepared frame per dataset snapshot: the rows
+    # plus every column any of the dataset's charts derives, computed once per snapshot (only for
+    # the new rows when the snapshot was appended to). Each chart's aggregated table is kept per
+    # snapshot as well, so svg, png and json of a chart aggregate once.
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self.charts = []
+        self._derived = {}
+        self._prepared = {}
+        self._tables = {}
+
+    def register(self, chart):
+        if (chart.aggregate is None) == (chart.source is None):
+            raise ValueError(f"{chart.path} needs either an aggregate or a source")
+        columns = self._derived.setdefault(chart.dataset, {})
+        for column, derive in chart.derived.items():
+            if columns.setdefault(column, derive) is not derive:
+                raise ValueError(f"{chart.path} derives {column} differently from another {chart.dataset} chart")
+        self.charts.append(chart)
+        # Frames prepared before this chart lack its columns
+        self._prepared.pop(chart.dataset, None)
+        return chart
+
+    def _derive(self, dataset, frame):
+        # assign() calls each function on the frame built so far, so a derived column can use an earlier one
+        return frame.assign(**self._derived.get(dataset, {}))
+
+    async def prepared(self, dataset):
+        entry = await self.datasets.get(dataset)
+        prepared = self._prepared.get(dataset)
+        if prepared is not None and prepared.version == entry.version:
+            cache_lookup("prepared_frame", "hit")
+            return prepared
+        with stage("transform"):
+            if prepared is not None and entry.base_version == prepared.version:
+                # Only rows were appended: derive the columns for the new ones alone
+                cache_lookup("prepared_frame", "update")
+                frame = append_rows(prepared.frame, self._derive(dataset, entry.appended))
+            else:
+                cache_lookup("prepared_frame", "miss")
+                frame = self._derive(dataset, entry.frame)
+        prepared = PreparedFrame(frame, entry.version)
+        self._prepared[dataset] = prepared
+        return prepared
+
+    async def table(self, chart, cohort=None):
+        if chart.source is not None:
+            return await chart.source(cohort)
+        prepared = await self.prepared(chart.dataset)
+        if cohort:
+            # Prepared rows line up with the snapshot's, so the cohort's row mask selects from them directly
+            _, index, bits = await cohort_index.select(chart.dataset, cohort)
+            if bits is not None:
+                with stage("transform"):
+                    return chart.aggregate(prepared.frame[index.mask(bits)])
+        cached = self._tables.get(chart)
+        if cached is not None and cached[0] == prepared.version:
+            return cached[1]
+        with stage("transform"):
+            table = chart.aggregate(prepared.frame)
+        self._tables[chart] = (prepared.version, table)
+        return table
+
+    def route(self, chart):
+        # The GET handler serving a chart, cached and bundled like any hand-written chart route
+        self.register(chart)
+
+        async def handler(cohort: Cohort, output: ChartOptions = Depends()):
+            try:
+                table = await self.table(chart, cohort)
+                content = await chart_content(chart.plot, table, output)
+
+                headers = {"Content-Disposition": f"inline; filename={chart.filename}.{output.format.extension}"}
+                return Response(content=content, media_type=output.format.media_type, headers=headers,
+                                status_code=200)
+            except HTTPException:
+                raise
+            except httpx.HTTPStatusError as e:
+                print(f"HTTP error: {e}")
+                raise HTTPException(status_code=400, detail=f"HTTP error: {e}")
+            except httpx.RequestError as e:
+                print(f"Request error: {e}")
+                raise HTTPException(status_code=400, detail=f"Request error: {e}")
+            except Exception as e:
+                print(f"Error occurred: {e}")
+                raise HTTPException(status_code=400, detail="Error generating the plot")
+
+        # Route names and OpenAPI operation ids come from the function name
+        handler.__name__ = handler.__qualname__ = chart.name
+        return cached_chart(chart.dataset)(handler)
+
+
+chart_registry = ChartRegistry(dataset_cache)
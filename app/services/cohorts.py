@@ -0,0 +1,203 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from app.services.datasetCache import dataset_cache
+from app.services.metrics import cache_lookup, stage
+from app.services.schemas import CODE_LABELS, DERIVED_COLUMNS
+
+
+@dataclass(frozen=True)
+class Cohort:
+    # Row filters from a chart request's query string, e.g. Sex=Female&Diabetic=Yes: a row is in the
+    # cohort when it holds one of the listed values in every listed column. Sorted, so the same
+    # filters in any order are the same cohort.
+    filters: tuple = ()
+
+    @classmethod
+    def from_query(cls, params, exclude=()):
+        # Every parameter not in exclude is a filter; the dataset rejects those naming none of its columns
+        values = {}
+        for name, value in params.multi_items():
+            if name not in exclude:
+                values.setdefault(name, set()).add(value)
+        return cls(tuple(sorted((name, tuple(sorted(accepted))) for name, accepted in values.items())))
+
+    def __bool__(self):
+        return bool(self.filters)
+
+
+def _levels(column, max_levels, labels=None):
+    # (codes, level labels) of a column with at most max_levels distinct values, else None. labels
+    # names the values of a coded column, e.g. 2 -> Yes, as the charts show them.
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes, levels = column.cat.codes.to_numpy(), column.cat.categories
+    elif column.dtype == object:
+        codes, levels = pd.factorize(column, sort=True)
+    elif column.dtype.kind in 'iu':
+        # Coded integers such as the 1/2 symptom columns; the value range bounds the level count
+        # without hashing columns like id
+        if not column.empty and int(column.max()) - int(column.min()) >= max_levels:
+            return None
+        codes, levels = pd.factorize(column, sort=True)
+    else:
+        return None
+    if len(levels) > max_levels:
+        return None
+    labels = labels or {}
+    return codes, [labels.get(level, str(level)) for level in levels]
+
+
+def _pack(flags):
+    # Bitmap of a boolean array: eight rows to a byte, zero-padded to whole 64-bit words so ANDs
+    # and popcounts run a word at a time
+    packed = np.packbits(flags)
+    return np.concatenate([packed, np.zeros(-len(packed) % 8, dtype=np.uint8)]).view(np.uint64)
+
+
+def _unpack(bits, rows):
+    return np.unpackbits(bits.view(np.uint8), count=rows).view(bool)
+
+
+def _bitmaps(codes, labels):
+    # value -> bitmap of the rows holding it
+    return {label: _pack(codes == code) for code, label in enumerate(labels)}
+
+
+def _append_bits(bits, rows, added):
+    # The bitmap of rows rows followed by the rows flagged in added; only a partial last word is repacked
+    whole, partial = divmod(rows, 64)
+    if partial:
+        added = np.concatenate([_unpack(bits[whole:], partial), added])
+    return np.concatenate([bits[:whole], _pack(added)])
+
+
+def popcount(bits):
+    return int(np.bitwise_count(bits).sum())
+
+
+def _columns(frame, derived):
+    columns = {name: frame[name] for name in frame.columns}
+    for name, derive in derived.items():
+        columns[name] = pd.Series(derive(frame), index=frame.index)
+    return columns
+
+
+class CohortIndex:
+    # Bitmap index over one dataset snapshot: one bitmap per value of every low-cardinality column,
+    # derived ones included. A cohort is then a few ANDs (ORs across values of one column) over
+    # arrays of rows / 64 words, rather than comparing every row of each filtered column.
+    def __init__(self, rows, bitmaps, version=None, max_levels=50, labels=None):
+        self.rows = rows
+        # column -> {value: bitmap}, or None for a column with too many values to index
+        self.bitmaps = bitmaps
+        self.version = version
+        self.max_levels = max_levels
+        # column -> {code: label} of coded columns, whose bitmaps are keyed by label
+        self.labels = labels or {}
+
+    @classmethod
+    def build(cls, frame, derived=None, max_levels=50, version=None, labels=None):
+        labels = labels or {}
+        bitmaps = {}
+        for name, column in _columns(frame, derived or {}).items():
+            levels = _levels(column, max_levels, labels.get(name))
+            bitmaps[name] = None if levels is None else _bitmaps(*levels)
+        return cls(len(frame), bitmaps, version, max_levels, labels)
+
+    def extend(self, appended, derived=None, version=None):
+        # Index rows appended after the indexed ones: every bitmap grows by their rows, and a value
+        # seen for the first time gets a bitmap that is empty up to them
+        columns = _columns(appended, derived or {})
+        unset = np.zeros((self.rows + 63) // 64, dtype=np.uint64)
+        absent = np.zeros(len(appended), dtype=bool)
+        bitmaps = {}
+        for name, existing in self.bitmaps.items():
+            levels = (_levels(columns[name], self.max_levels, self.labels.get(name))
+                      if existing is not None and name in columns else None)
+            values = [] if levels is None else [*existing, *(label for label in levels[1] if label not in existing)]
+            if levels is None or len(values) > self.max_levels:
+                bitmaps[name] = None
+                continue
+            codes, labels = levels
+            added = {label: codes == code for code, label in enumerate(labels)}
+            bitmaps[name] = {value: _append_bits(existing.get(value, unset), self.rows, added.get(value, absent))
+                             for value in values}
+        return CohortIndex(self.rows + len(appended), bitmaps, version, self.max_levels, self.labels)
+
+    def bitmap(self, column, value):
+        bitmaps = self.bitmaps.get(column)
+        return None if bitmaps is None else bitmaps.get(str(value))
+
+    def select(self, cohort):
+        # Bitmap of the cohort's rows
+        bits = None
+        for name, values in cohort.filters:
+            if name not in self.bitmaps:
+                raise HTTPException(status_code=422, detail=f"Unknown query parameter {name!r}, expected a chart "
+                                                            "option or one of: " + ", ".join(self.bitmaps))
+            bitmaps = self.bitmaps[name]
+            if bitmaps is None:
+                raise HTTPException(status_code=422, detail=f"{name} has too many distinct values to filter on")
+            # A coded column also takes its raw codes, e.g. smoking=2 for smoking=Yes
+            codes = {str(code): label for code, label in self.labels.get(name, {}).items()}
+            values = list(dict.fromkeys(codes.get(value, value) for value in values))
+            unknown = [value for value in values if value not in bitmaps]
+            if unknown:
+                raise HTTPException(status_code=422, detail=f"Unknown {name} value {unknown[0]!r}, expected one of: "
+                                                            + ", ".join(bitmaps))
+            matched = bitmaps[values[0]]
+            for value in values[1:]:
+                matched = matched | bitmaps[value]
+            bits = matched if bits is None else bits & matched
+        if popcount(bits) == 0:
+            raise HTTPException(status_code=400, detail="No rows match the cohort filter.")
+        return bits
+
+    def mask(self, bits):
+        # Boolean row mask of a bitmap, for selecting rows of the snapshot's frame
+        return _unpack(bits, self.rows)
+
+
+class CohortIndexCache:
+    # One cohort index per dataset snapshot, built the first time a request filters that dataset
+    # and then extended with appended rows, like the cubes
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self._indexes = {}
+
+    async def get(self, endpoint):
+        entry = await self.datasets.get(endpoint)
+        index = self._indexes.get(endpoint)
+        if index is not None and index.version == entry.version:
+            cache_lookup("cohort_index", "hit")
+            return entry, index
+        derived = DERIVED_COLUMNS.get(endpoint)
+        with stage("transform"):
+            if index is not None and entry.base_version == index.version:
+                cache_lookup("cohort_index", "update")
+                index = index.extend(entry.appended, derived, version=entry.version)
+            else:
+                cache_lookup("cohort_index", "miss")
+                index = CohortIndex.build(entry.frame, derived, version=entry.version,
+                                          labels=CODE_LABELS.get(endpoint))
+        self._indexes[endpoint] = index
+        return entry, index
+
+    async def select(self, endpoint, cohort):
+        # (snapshot, index, bitmap of the cohort's rows). Index and bitmap are None for an empty
+        # cohort, i.e. every row is in it.
+        if not cohort:
+            return await self.datasets.get(endpoint), None, None
+        entry, index = await self.get(endpoint)
+        return entry, index, index.select(cohort)
+
+    async def get_frame(self, endpoint, cohort):
+        # Like dataset_cache.get_frame: the handler's own copy, of the cohort's rows only
+        entry, index, bits = await self.select(endpoint, cohort)
+        return entry.frame.copy() if bits is None else entry.frame[index.mask(bits)]
+
+
+cohort_index = CohortIndexCache(dataset_cache)
@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from app.services.cohorts import cohort_index
+from app.services.datasetCache import dataset_cache, HEART_DISEASE, LUNG_CANCER
+from app.services.encoding import ordinal
+from app.services.metrics import cache_lookup, stage
+from app.services.schemas import DERIVED_COLUMNS
+
+
+@dataclass(frozen=True)
+class CorrelationStats:
+    # Sufficient statistics for a correlation matrix over k numeric columns: row count, column
+    # means and the k x k matrix of centred cross-products. Two sets merge exactly (Chan et al.),
+    # so new rows are folded in without revisiting old ones, and the matrix itself is O(k^2).
+    columns: tuple
+    n: int
+    mean: np.ndarray
+    comoment: np.ndarray
+    version: str = None
+    rows: int = 0  # source rows consumed, including incomplete ones that were skipped
+
+    @classmethod
+    def build(cls, numeric, version=None):
+        # Rows with a missing value in any column are skipped, like dropna() before corr()
+        values = numeric.to_numpy(dtype='float64')
+        complete = ~np.isnan(values).any(axis=1)
+        if not complete.all():
+            values = values[complete]
+        mean = values.mean(axis=0) if len(values) else np.zeros(values.shape[1])
+        centred = values - mean
+        return cls(tuple(numeric.columns), len(values), mean, centred.T @ centred, version, len(numeric))
+
+    def merge(self, other, version=None):
+        if other.columns != self.columns:
+            raise ValueError("Correlation statistics cover different columns")
+        n = self.n + other.n
+        if n == 0:
+            return CorrelationStats(self.columns, 0, self.mean, self.comoment, version, self.rows + other.rows)
+        delta = other.mean - self.mean
+        mean = self.mean + delta * (other.n / n)
+        comoment = self.comoment + other.comoment + np.outer(delta, delta) * (self.n * other.n / n)
+        return CorrelationStats(self.columns, n, mean, comoment, version, self.rows + other.rows)
+
+    def update(self, numeric, version=None):
+        # Fold in appended rows
+        return self.merge(CorrelationStats.build(numeric), version)
+
+    def correlation(self):
+        scale = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            matrix = self.comoment / np.outer(scale, scale)
+        # A constant column has no correlation (NaN), like DataFrame.corr()
+        np.fill_diagonal(matrix, np.where(scale > 0, 1.0, np.nan))
+        return pd.DataFrame(matrix, index=list(self.columns), columns=list(self.columns))
+
+
+def heart_disease_numeric(frame):
+    numeric = frame[['BMI', 'PhysicalHealth', 'MentalHealth', 'SleepTime']].astype('float64')
+    numeric.insert(0, 'HeartDisease', ordinal(frame['HeartDisease'], ['No', 'Yes'], start=0))
+    return numeric
+
+
+def lung_cancer_numeric(frame):
+    # Symptoms (1 = No, 2 = Yes) against the diagnosis coded the same way
+    numeric = frame[['yellow_fingers', 'anxiety', 'coughing', 'wheezing', 'chest_pain']].astype('float64')
+    numeric['lung_cancer'] = DERIVED_COLUMNS[LUNG_CANCER]['diagnosis'](frame)
+    return numeric
+
+
+# The numeric columns each dataset's correlation matrix covers, derived from a snapshot
+CORRELATIONS = {
+    HEART_DISEASE: heart_disease_numeric,
+    LUNG_CANCER: lung_cancer_numeric,
+}
+
+
+class CorrelationCache:
+    # Correlation statistics per dataset snapshot: one pass over the rows when a new snapshot
+    # arrives (only over the new rows when it was appended to), then every matrix costs O(k^2)
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self._stats = {}
+
+    async def get(self, endpoint):
+        entry = await self.datasets.get(endpoint)
+        stats = self._stats.get(endpoint)
+        if stats is not None and stats.version == entry.version:
+            cache_lookup("correlation", "hit")
+            return stats
+        numeric = CORRELATIONS[endpoint]
+        with stage("transform"):
+            if stats is not None and entry.base_version == stats.version:
+                # Only rows were appended since these stats: fold in the new ones
+                cache_lookup("correlation", "update")
+                stats = stats.update(numeric(entry.appended), entry.version)
+            else:
+                cache_lookup("correlation", "miss")
+                stats = CorrelationStats.build(numeric(entry.frame), entry.version)
+        self._stats[endpoint] = stats
+        return stats
+
+    async def correlation(self, endpoint, cohort=None):
+        if cohort:
+            # A cohort's matrix takes one pass over its own rows
+            entry, index, bits = await cohort_index.select(endpoint, cohort)
+            if bits is not None:
+                with stage("transform"):
+                    return CorrelationStats.build(CORRELATIONS[endpoint](entry.frame[index.mask(bits)])).correlation()
+        return (await self.get(endpoint)).correlation()
+
+
+correlation_cache = CorrelationCache(dataset_cache)
@@ -0,0 +1,352 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import pandas as pd
+
+from app import config
+# Dataset endpoint names live with their schemas; the routers import them from here
+from app.services.metrics import cache_lookup, metrics, record_stage, stage
+from app.services.schemas import (HEART_DISEASE, LUNG_CANCER, PATIENTS, BLOOD_SUGAR, SYNC_KEYS, append_rows,
+                                  load_frame, stream_frame)
+from app.services.snapshotStore import SnapshotStore
+from app.services.upstreamClient import upstream_client
+
+
+@dataclass(frozen=True)
+class CachedDataset:
+    # An immutable snapshot: refreshes swap in a new one, they never modify the one handlers are reading
+    frame: pd.DataFrame
+    version: str  # sha256 of the upstream body, changes whenever the data does
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    load_seconds: float = 0.0
+    nbytes: int = 0
+    # Largest SYNC_KEYS value in the frame, None when the dataset can't be synced incrementally
+    high_water: object = None
+    full_synced_at: float = 0.0
+    # Set when this snapshot is base_version with rows appended after its first base_rows, so
+    # anything derived from base_version can be brought up to date from the new rows alone
+    base_version: Optional[str] = None
+    base_rows: int = 0
+
+    @property
+    def appended(self):
+        return self.frame.iloc[self.base_rows:]
+
+
+def high_water_mark(endpoint, frame):
+    key = SYNC_KEYS.get(endpoint)
+    if key is None or key not in frame.columns or frame.empty:
+        return None
+    mark = frame[key].max()
+    if pd.isna(mark):
+        return None
+    return mark.item() if hasattr(mark, "item") else mark
+
+
+class UpstreamTransfer:
+    # Splits one load's time into waiting on the upstream (fetch) and decoding the body (parse),
+    # which interleave when the body is parsed as it streams in, and counts the body bytes
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.fetch = 0.0
+        self.bytes = 0
+
+    def opened(self):
+        # Headers are in: sending the request and waiting for the response so far was all fetch
+        self.fetch = time.perf_counter() - self.started
+
+    async def chunks(self, response):
+        chunks = response.aiter_bytes()
+        while True:
+            waited = time.perf_counter()
+            chunk = await anext(chunks, None)
+            self.fetch += time.perf_counter() - waited
+            if chunk is None:
+                return
+            self.bytes += len(chunk)
+            yield chunk
+
+    async def read(self, response):
+        waited = time.perf_counter()
+        content = await response.aread()
+        self.fetch += time.perf_counter() - waited
+        self.bytes += len(content)
+        return content
+
+    def record(self, endpoint, sync):
+        parse = time.perf_counter() - self.started - self.fetch
+        metrics.observe("dataset_load_seconds", self.fetch, endpoint=endpoint, stage="fetch")
+        metrics.observe("dataset_load_seconds", parse, endpoint=endpoint, stage="parse")
+        metrics.observe("dataset_load_bytes", self.bytes, endpoint=endpoint, sync=sync)
+        # Also charged to the request that started the load, if any
+        record_stage("fetch", self.fetch)
+        record_stage("parse", parse)
+
+
+class DatasetCache:
+    def __init__(self, client, ttl, revalidate=False, streaming=False, batch_rows=50_000, max_stale=0,
+                 incremental=False, full_sync_interval=3600, store=None):
+        self.client = client
+        self.ttl = ttl
+        self.revalidate = revalidate
+        self.streaming = streaming
+        self.batch_rows = batch_rows
+        self.max_stale = max_stale
+        self.incremental = incremental
+        self.full_sync_interval = full_sync_interval
+        self.store = store
+        self._entries = {}
+        self._saving = set()
+        self._inflight = {}
+        self._errors = {}
+
+    def age(self, entry):
+        return time.monotonic() - entry.fetched_at
+
+    def is_fresh(self, entry):
+        return entry is not None and self.age(entry) < self.ttl
+
+    def is_servable(self, entry):
+        # Past its TTL but within the staleness limit: serve it while a refresh runs in the background
+        return entry is not None and self.age(entry) < self.ttl + self.max_stale
+
+    async def get(self, endpoint):
+        entry = self._entries.get(endpoint)
+        if entry is None and self.store is not None:
+            entry = self._restore(endpoint)
+        if self.is_fresh(entry):
+            cache_lookup("dataset", "hit")
+            return entry
+        if self.is_servable(entry):
+            cache_lookup("dataset", "stale")
+            self._start_load(endpoint)
+            return entry
+        cache_lookup("dataset", "miss")
+        # Waiting on a load another caller started counts as fetch too
+        with stage("fetch"):
+            return await self.refresh(endpoint)
+
+    async def refresh(self, endpoint):
+        # Shield so a cancelled caller does not cancel the fetch the others are waiting on
+        return await asyncio.shield(self._start_load(endpoint))
+
+    def _start_load(self, endpoint):
+        # Single-flight: concurrent misses and refreshes for the same endpoint share one upstream fetch
+        task = self._inflight.get(endpoint)
+        if task is None:
+            task = asyncio.ensure_future(self._load(endpoint, self._entries.get(endpoint)))
+            self._inflight[endpoint] = task
+            task.add_done_callback(lambda done: self._forget(endpoint, done))
+        return task
+
+    async def get_frame(self, endpoint):
+        # Handlers mutate the frame they work on, so each one gets its own copy
+        entry = await self.get(endpoint)
+        return entry.frame.copy()
+
+    async def flush(self):
+        # Let snapshot writes still in progress finish, e.g. before shutting down
+        await asyncio.gather(*self._saving, return_exceptions=True)
+
+    def invalidate(self, endpoint=None):
+        if endpoint is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(endpoint, None)
+
+    def status(self, endpoint):
+        entry = self._entries.get(endpoint)
+        status = {"loaded": entry is not None, "refreshing": endpoint in self._inflight,
+                  "last_error": self._errors.get(endpoint)}
+        if entry is not None:
+            status.update({
+                "version": entry.version[:12],
+                "age_seconds": round(self.age(entry), 1),
+                "fresh": self.is_fresh(entry),
+                "rows": len(entry.frame),
+                "columns": len(entry.frame.columns),
+                "bytes": entry.nbytes,
+                "load_seconds": round(entry.load_seconds, 3),
+                "high_water": entry.high_water,
+                "appended_rows": len(entry.frame) - entry.base_rows if entry.base_version else None,
+            })
+        return status
+
+    def _forget(self, endpoint, task):
+        if self._inflight.get(endpoint) is task:
+            del self._inflight[endpoint]
+        if task.cancelled():
+            return
+        # Background loads have no caller to raise into, so keep the failure for the status endpoint
+        error = task.exception()
+        if error is not None:
+            metrics.inc("dataset_load_errors_total", endpoint=endpoint)
+            self._errors[endpoint] = f"{type(error).__name__}: {error}"
+        else:
+            self._errors.pop(endpoint, None)
+
+    def _syncs_incrementally(self, previous):
+        # Edits and deletes never move the high-water mark, so a full reload still runs periodically
+        return (self.incremental and previous is not None and previous.high_water is not None
+                and time.monotonic() - previous.full_synced_at < self.full_sync_interval)
+
+    async def _read_frame(self, endpoint, response, digest, transfer, unchanged=None):
+        # The body as a typed frame, hashed into digest. None when the digest comes out as
+        # unchanged, in which case a buffered body is not parsed at all.
+        if self.streaming:
+            frame = await stream_frame(endpoint, transfer.chunks(response), self.batch_rows, digest.update)
+            return None if digest.hexdigest() == unchanged else frame
+        content = await transfer.read(response)
+        digest.update(content)
+        if digest.hexdigest() == unchanged:
+            return None
+        # Parsing a large body takes seconds of CPU, so it runs off the event loop
+        return await asyncio.to_thread(load_frame, endpoint, content)
+
+    async def _load(self, endpoint, previous):
+        transfer = UpstreamTransfer()
+        if self._syncs_incrementally(previous):
+            entry = await self._load_appended(endpoint, previous, transfer)
+            transfer.record(endpoint, "since")
+        else:
+            entry = await self._load_full(endpoint, previous, transfer)
+            transfer.record(endpoint, "full")
+        return entry
+
+    async def _load_full(self, endpoint, previous, transfer):
+        started = time.monotonic()
+        headers = {}
+        if self.revalidate and previous is not None:
+            if previous.etag:
+                headers["If-None-Match"] = previous.etag
+            if previous.last_modified:
+                headers["If-Modified-Since"] = previous.last_modified
+
+        async with self.client.stream(endpoint, headers=headers) as response:
+            transfer.opened()
+            if response.status_code == 304 and previous is not None:
+                return self._renew(endpoint, previous, full_synced_at=time.monotonic())
+            response.raise_for_status()
+            digest = hashlib.sha256()
+            frame = await self._read_frame(endpoint, response, digest, transfer,
+                                           unchanged=previous.version if previous is not None else None)
+
+        if frame is None:
+            # Upstream body is unchanged, keep the existing snapshot (and everything derived from it)
+            return self._renew(endpoint, previous, full_synced_at=time.monotonic())
+
+        entry = CachedDataset(
+            frame=frame,
+            version=digest.hexdigest(),
+            fetched_at=time.monotonic(),
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            load_seconds=time.monotonic() - started,
+            nbytes=int(frame.memory_usage(deep=True).sum()),
+            high_water=high_water_mark(endpoint, frame),
+            full_synced_at=time.monotonic(),
+        )
+        # Swapping the dict entry is atomic for every handler on the event loop
+        self._entries[endpoint] = entry
+        self._save(endpoint, entry)
+        return entry
+
+    async def _load_appended(self, endpoint, previous, transfer):
+        # Ask only for records past the snapshot's high-water mark and append them to a new snapshot
+        started = time.monotonic()
+        key = SYNC_KEYS[endpoint]
+        # The new version hashes the old one plus the appended body, so it changes exactly when rows arrive
+        digest = hashlib.sha256(previous.version.encode())
+        async with self.client.stream(endpoint, params={"since": previous.high_water}) as response:
+            transfer.opened()
+            response.raise_for_status()
+            rows = await self._read_frame(endpoint, response, digest, transfer)
+
+        if key in rows.columns:
+            # An upstream that ignores since sends everything, so keep only what is past the mark
+            rows = rows[(rows[key] > previous.high_water).to_numpy()]
+        if rows.empty or key not in rows.columns:
+            return self._renew(endpoint, previous)
+
+        frame = append_rows(previous.frame, rows)
+        entry = CachedDataset(
+            frame=frame,
+            version=digest.hexdigest(),
+            fetched_at=time.monotonic(),
+            # The since response's validators describe only the appended rows, so the full body's
+            # carry over for the next full sync to revalidate with
+            etag=previous.etag,
+            last_modified=previous.last_modified,
+            load_seconds=time.monotonic() - started,
+            nbytes=int(frame.memory_usage(deep=True).sum()),
+            high_water=high_water_mark(endpoint, frame),
+            full_synced_at=previous.full_synced_at,
+            base_version=previous.version,
+            base_rows=len(previous.frame),
+        )
+        metrics.inc("dataset_appended_rows_total", len(rows), endpoint=endpoint)
+        self._entries[endpoint] = entry
+        self._save(endpoint, entry)
+        return entry
+
+    def _restore(self, endpoint):
+        # First use after a restart: start from the snapshot on disk rather than the upstream
+        started = time.monotonic()
+        saved = self.store.load(endpoint)
+        if saved is None:
+            return None
+        frame, info = saved
+        now, wall = time.monotonic(), time.time()
+        age = max(0.0, wall - info["saved_at"])
+        entry = CachedDataset(
+            frame=frame,
+            version=info["version"],
+            # However old, a restored snapshot counts as just expired: it is served right away
+            # while a fresher one loads in the background
+            fetched_at=now - min(age, self.ttl),
+            etag=info.get("etag"),
+            last_modified=info.get("last_modified"),
+            load_seconds=time.monotonic() - started,
+            nbytes=int(frame.memory_usage(deep=True).sum()),
+            high_water=info.get("high_water"),
+            full_synced_at=now - max(0.0, wall - (info.get("full_synced_at") or 0.0)),
+        )
+        metrics.inc("dataset_snapshot_total", endpoint=endpoint, operation="restore", result="ok")
+        self._entries[endpoint] = entry
+        return entry
+
+    def _save(self, endpoint, entry):
+        if self.store is None:
+            return
+        # Wall-clock time of the last full sync, as monotonic time doesn't survive a restart
+        full_synced_at = time.time() - (time.monotonic() - entry.full_synced_at)
+        task = asyncio.ensure_future(asyncio.to_thread(
+            self.store.save, endpoint, entry.frame, version=entry.version, etag=entry.etag,
+            last_modified=entry.last_modified, high_water=entry.high_water, full_synced_at=full_synced_at))
+        # Keep a reference until the write finishes
+        self._saving.add(task)
+        task.add_done_callback(lambda done: self._saved(endpoint, done))
+
+    def _saved(self, endpoint, task):
+        self._saving.discard(task)
+        if task.cancelled():
+            return
+        # A failed write only costs the next cold start
+        result = "error" if task.exception() is not None else "ok" if task.result() else "unchanged"
+        metrics.inc("dataset_snapshot_total", endpoint=endpoint, operation="save", result=result)
+
+    def _renew(self, endpoint, previous, **changes):
+        entry = replace(previous, fetched_at=time.monotonic(), **changes)
+        self._entries[endpoint] = entry
+        return entry
+
+
+dataset_cache = DatasetCache(upstream_client, config.DATASET_CACHE_TTL, config.DATASET_CACHE_REVALIDATE,
+                             config.DATASET_STREAMING, config.DATASET_STREAM_BATCH_ROWS, config.DATASET_MAX_STALE,
+                             config.DATASET_INCREMENTAL, config.DATASET_FULL_SYNC_INTERVAL,
+                             SnapshotStore(config.DATASET_SNAPSHOT_DIR) if config.DATASET_SNAPSHOT_DIR else None)
@@ -0,0 +1,58 @@
+import asyncio
+import random
+import time
+
+from app import config
+from app.services.datasetCache import dataset_cache
+from app.services.schemas import SCHEMAS
+
+
+class DatasetRefresher:
+    # Keeps every dataset snapshot warm from a background task per endpoint, so request
+    # handlers read whatever snapshot is current instead of waiting on the upstream
+    def __init__(self, datasets, endpoints, interval, jitter):
+        self.datasets = datasets
+        self.endpoints = list(endpoints)
+        self.interval = interval
+        self.jitter = jitter
+        self._tasks = {}
+        self._next_refresh = {}
+
+    @property
+    def running(self):
+        return any(not task.done() for task in self._tasks.values())
+
+    def start(self):
+        for endpoint in self.endpoints:
+            if endpoint not in self._tasks:
+                self._tasks[endpoint] = asyncio.ensure_future(self._run(endpoint))
+
+    async def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        self._next_refresh.clear()
+
+    def next_refresh_in(self, endpoint):
+        due = self._next_refresh.get(endpoint)
+        return None if due is None else round(max(0.0, due - time.monotonic()), 1)
+
+    async def _run(self, endpoint):
+        # The first pass only loads what isn't fresh already, e.g. a snapshot just restored from disk
+        load = self.datasets.get
+        while True:
+            try:
+                await load(endpoint)
+            except Exception:
+                # Already logged and recorded by the cache; the previous snapshot keeps being served
+                pass
+            load = self.datasets.refresh
+            # Jitter keeps the endpoints from refreshing in lockstep against the upstream
+            delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+            self._next_refresh[endpoint] = time.monotonic() + delay
+            await asyncio.sleep(delay)
+
+
+dataset_refresher = DatasetRefresher(dataset_cache, SCHEMAS, config.DATASET_REFRESH_INTERVAL,
+                                     config.DATASET_REFRESH_JITTER)
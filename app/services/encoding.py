@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+# Vectorized feature encodings shared by the routers. Each works on a whole column at
+# once (masks, categorical codes, pd.cut bins) instead of a Python call per row.
+
+BMI_BINS = [-np.inf, 18.5, 25, 30, 35, np.inf]
+BMI_ORDER = ['Underweight (0-18.5)', 'Normal (18.5-24.9)', 'Overweight (25-29.9)', 'Obese (30-34.9)',
+             'Severely Obese (35+)']
+
+AGE_ORDER = ['18-24', '25-29', '30-34', '35-39', '40-44', '45-49', '50-54', '55-59', '60-64', '65-69',
+             '70-74', '75-79', '80 or older']
+
+
+def mask(series, value='Yes'):
+    return (series == value).to_numpy()
+
+
+def binary(series, positive='Yes'):
+    # 1 where the value equals positive, else 0 (what `.apply(lambda x: 1 if x == 'Yes' else 0)` did)
+    return pd.Series(mask(series, positive).astype('int8'), index=series.index, name=series.name)
+
+
+def codes(series, categories):
+    # Position of each value in categories, -1 for anything not listed
+    return pd.Categorical(series, categories=categories).codes
+
+
+def ordinal(series, order, start=1):
+    # order[0] -> start, order[1] -> start + 1, ...; unknown values become NaN
+    position = codes(series, order).astype('float64')
+    position[position < 0] = np.nan
+    return pd.Series(position + start, index=series.index, name=series.name)
+
+
+def bmi_category(bmi):
+    # Bins are contiguous and left-closed, so e.g. 24.95 is Normal rather than falling through to the last bin
+    return pd.cut(pd.to_numeric(bmi, errors='coerce'), BMI_BINS, labels=BMI_ORDER, right=False)
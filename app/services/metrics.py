@@ -0,0 +1,199 @@
+import asyncio
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app import config
+
+# Histogram bucket upper bounds: seconds, and bytes in powers of four from 256 B to 64 MB
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = tuple(float(4 ** power) for power in range(4, 14))
+
+# name -> (type, help, buckets)
+METRICS = {
+    "http_requests_total": ("counter", "Requests by route, method and status", None),
+    "http_request_duration_seconds": ("histogram", "Request latency by route", LATENCY_BUCKETS),
+    "http_request_stage_seconds": ("histogram", "Time per request spent in each stage (fetch, parse, transform, "
+                                                "render, serialize, compress), nested stages excluded",
+                                   LATENCY_BUCKETS),
+    "http_response_size_bytes": ("histogram", "Response body size by route", SIZE_BUCKETS),
+    "dataset_load_seconds": ("histogram", "Dataset load time by upstream endpoint and stage (fetch, parse)",
+                             LATENCY_BUCKETS),
+    "dataset_load_bytes": ("histogram", "Upstream body size per dataset load, by endpoint and sync kind",
+                           SIZE_BUCKETS),
+    "dataset_load_errors_total": ("counter", "Failed dataset loads by endpoint; the last error is on /datasets/status",
+                                  None),
+    "dataset_appended_rows_total": ("counter", "Rows appended to dataset snapshots by incremental sync, by endpoint",
+                                    None),
+    "dataset_snapshot_total": ("counter", "Snapshot restores and saves by endpoint, operation and result (ok, "
+                                          "unchanged, error)", None),
+    "model_fit_seconds": ("histogram", "Risk model fit time by model and start (warm, cold)", LATENCY_BUCKETS),
+    "cache_requests_total": ("counter", "Cache lookups by cache and result (hit, miss, stale, update, coalesced, "
+                                        "cohort)", None),
+    "event_loop_lag_seconds": ("histogram", "How late the event loop woke a sleeping task", LATENCY_BUCKETS),
+}
+
+# Stage seconds of the request being handled, and the enclosing stage's nested-time tally
+_request_stages = ContextVar("request_stages", default=None)
+_enclosing = ContextVar("enclosing_stage", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+def _labels(labels):
+    def escape(value):
+        return str(value).replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}" if labels else ""
+
+
+class Metrics:
+    # Counters and histograms in process memory, written out in the Prometheus text format.
+    # Everything is updated from the event loop, so no locking.
+    def __init__(self, definitions):
+        self.definitions = definitions
+        self._series = {name: {} for name in definitions}
+
+    def inc(self, name, value=1, **labels):
+        series = self._series[name]
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        series = self._series[name]
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self.definitions[name][2])
+        histogram.observe(value)
+
+    def exposition(self):
+        lines = []
+        for name, (kind, help_text, buckets) in self.definitions.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for labels, value in sorted(self._series[name].items()):
+                if kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip((*buckets, "+Inf"), value.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels((*labels, ('le', bound)))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {value.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(METRICS)
+
+
+def cache_lookup(cache, result):
+    metrics.inc("cache_requests_total", cache=cache, result=result)
+
+
+def record_stage(name, seconds):
+    # Adds time to a stage of the current request; a no-op outside one (e.g. the background refresher)
+    stages = _request_stages.get()
+    if stages is None:
+        return
+    stages[name] = stages.get(name, 0.0) + seconds
+    enclosing = _enclosing.get()
+    if enclosing is not None:
+        enclosing[0] += seconds
+
+
+@contextmanager
+def stage(name):
+    # Times a block as one stage of the current request. Stages nest: time recorded by an inner
+    # stage is taken out of the outer one, so a request's stages add up to at most its latency.
+    if _request_stages.get() is None:
+        yield
+        return
+    nested = [0.0]
+    token = _enclosing.set(nested)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _enclosing.reset(token)
+        record_stage(name, elapsed - nested[0])
+        # record_stage only charged the outer stage with the exclusive part
+        enclosing = _enclosing.get()
+        if enclosing is not None:
+            enclosing[0] += nested[0]
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware (no per-request task or body buffering): times each request, counts its
+    # response bytes and writes out the stages handlers recorded, labelled by route template
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stages = {}
+        stages_token = _request_stages.set(stages)
+        enclosing_token = _enclosing.set(None)
+        response = {"status": 500, "bytes": 0}
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - started
+            _enclosing.reset(enclosing_token)
+            _request_stages.reset(stages_token)
+            # The route template, not the path, so /patient/{patient_id} stays one series
+            route = scope["route"].path if "route" in scope else "unmatched"
+            metrics.inc("http_requests_total", route=route, method=scope["method"], status=response["status"])
+            metrics.observe("http_request_duration_seconds", elapsed, route=route)
+            metrics.observe("http_response_size_bytes", response["bytes"], route=route)
+            for name, seconds in stages.items():
+                metrics.observe("http_request_stage_seconds", seconds, route=route, stage=name)
+
+
+class LoopLagMonitor:
+    # Sleeps a fixed interval and records how much later than asked it woke up: time the loop
+    # spent on something else, e.g. CPU-bound work in a handler
+    def __init__(self, interval):
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            metrics.observe("event_loop_lag_seconds", max(0.0, loop.time() - started - self.interval))
+
+
+loop_lag_monitor = LoopLagMonitor(config.EVENT_LOOP_LAG_INTERVAL)
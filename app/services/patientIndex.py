@@ -0,0 +1,61 @@
+import numpy as np
+
+from app.services.datasetCache import dataset_cache
+from app.services.metrics import cache_lookup, stage
+
+
+class PatientIndex:
+    # Hash index from patient id to row offset in one dataset snapshot
+    def __init__(self, offsets, version=None):
+        self.offsets = offsets
+        self.version = version
+
+    @classmethod
+    def build(cls, frame, key='id', version=None):
+        if key not in frame.columns or frame.empty:
+            return cls({}, version)
+        # np.unique's first-occurrence offsets keep the old "first matching row" behaviour for duplicate ids
+        ids, first = np.unique(frame[key].to_numpy(), return_index=True)
+        return cls(dict(zip(ids.tolist(), first.tolist())), version)
+
+    def extend(self, appended, base_rows, key='id', version=None):
+        # Index rows appended after the first base_rows; ids already indexed keep their first row
+        added = PatientIndex.build(appended, key)
+        offsets = {patient_id: base_rows + offset for patient_id, offset in added.offsets.items()}
+        offsets.update(self.offsets)
+        return PatientIndex(offsets, version)
+
+    def row(self, frame, patient_id):
+        offset = self.offsets.get(patient_id)
+        return None if offset is None else frame.iloc[offset]
+
+
+class PatientIndexCache:
+    # One index per dataset snapshot, rebuilt only when a refresh swaps in a new version
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self._indexes = {}
+
+    async def get(self, endpoint):
+        entry = await self.datasets.get(endpoint)
+        index = self._indexes.get(endpoint)
+        if index is not None and index.version == entry.version:
+            cache_lookup("patient_index", "hit")
+            return entry, index
+        with stage("transform"):
+            if index is not None and entry.base_version == index.version:
+                cache_lookup("patient_index", "update")
+                index = index.extend(entry.appended, entry.base_rows, version=entry.version)
+            else:
+                cache_lookup("patient_index", "miss")
+                index = PatientIndex.build(entry.frame, version=entry.version)
+        self._indexes[endpoint] = index
+        return entry, index
+
+    async def lookup(self, endpoint, patient_id):
+        # The patient's row from the current snapshot (read-only, not a copy), or None
+        entry, index = await self.get(endpoint)
+        return index.row(entry.frame, patient_id)
+
+
+patient_index = PatientIndexCache(dataset_cache)
@@ -0,0 +1,150 @@
+from io import BytesIO
+
+import seaborn as sns
+import matplotlib
+# Pin the backend; otherwise the first rcParams lookup that resolves it goes through pyplot
+matplotlib.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
+
+# Chart drawing that runs inside the render pool workers. A chart is described by a plain
+# dict spec (plot kind, labels, styling) plus the small aggregated table it draws, both of
+# which pickle cheaply across the process boundary.
+#
+# Figures are built directly on an Agg canvas rather than through pyplot, so nothing is
+# registered with pyplot's global figure manager and there is no plt.close() to forget:
+# a figure is garbage as soon as render_chart returns or raises.
+
+# Keep SVG text as <text> instead of one path per glyph (several times smaller, and selectable),
+# and make SVG output deterministic so unchanged charts keep their ETag across re-renders
+matplotlib.rcParams['svg.fonttype'] = 'none'
+matplotlib.rcParams['svg.hashsalt'] = 'patient-disease-analytics'
+SAVE_OPTIONS = {
+    'svg': {'metadata': {'Date': None}},
+    'png': {'metadata': {'Software': None}},
+    'webp': {'pil_kwargs': {'lossless': True, 'method': 4}},
+}
+
+
+def _draw_bar(ax, data, spec):
+    x, y, hue = spec['x'], spec['y'], spec.get('hue')
+    palette, legend = spec.get('palette'), bool(spec.get('legend'))
+    if hue is None and palette is not None:
+        # Colour each bar from the palette without adding a legend, like countplot(palette=...)
+        hue, legend = x, False
+    sns.barplot(data=data, x=x, y=y, hue=hue, palette=palette, color=spec.get('color'),
+                order=spec.get('order'), hue_order=spec.get('hue_order'), errorbar=None, legend=legend, ax=ax)
+
+    if spec.get('error'):
+        ax.errorbar(range(len(data)), data[y], yerr=data[spec['error']], fmt='none', ecolor='.26', elinewidth=2)
+
+    labels = spec.get('bar_labels')
+    if labels:
+        for container in ax.containers:
+            color = container.patches[0].get_facecolor() if labels.get('match_color') and container.patches else None
+            ax.bar_label(container, fmt=labels.get('fmt', '{:.1f}'), color=color, fontsize=labels.get('fontsize'))
+
+
+def _draw_heatmap(ax, data, spec):
+    sns.heatmap(data, ax=ax, **spec.get('heatmap', {}))
+
+
+def _draw_box(ax, data, spec):
+    x, hue = spec['x'], spec.get('hue')
+    categories = list(dict.fromkeys(data[x]))
+    levels = list(dict.fromkeys(data[hue])) if hue else [None]
+    colors = sns.color_palette(spec.get('palette'), len(levels) if hue else len(categories))
+    width = 0.8 / len(levels)
+
+    for j, level in enumerate(levels):
+        rows = data if hue is None else data[data[hue] == level]
+        positions = [categories.index(value) - 0.4 + width * (j + 0.5) for value in rows[x]]
+        stats = rows[['med', 'q1', 'q3', 'whislo', 'whishi', 'fliers']].to_dict('records')
+        artists = ax.bxp(stats, positions=positions, widths=width * 0.8, patch_artist=True, manage_ticks=False,
+                         medianprops={'color': '.26'}, flierprops={'marker': 'd', 'markerfacecolor': '.26'})
+        for i, box in enumerate(artists['boxes']):
+            box.set_facecolor(colors[j] if hue else colors[categories.index(rows[x].iloc[i])])
+
+    ax.set_xticks(range(len(categories)), categories)
+    if hue:
+        handles = [Patch(facecolor=colors[j], label=level) for j, level in enumerate(levels)]
+        ax.legend(handles=handles, **spec.get('legend', {}))
+
+
+def _draw_hist(ax, data, spec):
+    hue = spec['hue']
+    bins, kde = data['bins'], data['kde']
+    levels = list(dict.fromkeys(bins[hue]))
+    colors = sns.color_palette(spec.get('palette'), len(levels))
+
+    # Stack each hue level on top of the previous ones, bars and KDE curves alike
+    bottom, baseline = 0, 0
+    for level, color in zip(levels, colors):
+        counts = bins[bins[hue] == level]
+        curve = kde[kde[hue] == level]
+        ax.bar(counts['left'], counts['count'], width=counts['width'], bottom=bottom, align='edge',
+               color=color, alpha=0.75, edgecolor='white', linewidth=0.5, label=level)
+        ax.plot(curve['x'], curve['density'].to_numpy() + baseline, color=color)
+        bottom = bottom + counts['count'].to_numpy()
+        baseline = baseline + curve['density'].to_numpy()
+    ax.legend(title=hue)
+
+
+def _draw_line(ax, data, spec):
+    ax.plot(data[spec['x']], data[spec['y']], marker=spec.get('marker'), linestyle=spec.get('linestyle', '-'),
+            color=spec.get('color'))
+    if spec.get('grid'):
+        ax.grid(True)
+
+
+DRAWERS = {
+    'bar': _draw_bar,
+    'heatmap': _draw_heatmap,
+    'box': _draw_box,
+    'hist': _draw_hist,
+    'line': _draw_line,
+}
+
+
+def _decorate(ax, spec):
+    if 'title' in spec:
+        ax.set_title(spec['title'])
+    if 'xlabel' in spec:
+        ax.set_xlabel(spec['xlabel'])
+    if 'ylabel' in spec:
+        ax.set_ylabel(spec['ylabel'])
+    if 'xticks_rotation' in spec:
+        ax.tick_params(axis='x', labelrotation=spec['xticks_rotation'])
+    if 'ylim' in spec:
+        ax.set_ylim(*spec['ylim'])
+    if spec['kind'] == 'bar' and spec.get('legend'):
+        ax.legend(**spec['legend'])
+
+
+def new_figure(figsize, dpi=None):
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def render_chart(spec, data, format='svg', width=None, dpi=None):
+    figsize = spec.get('figsize', (8, 6))
+    if width:
+        # Requested pixel width at the requested DPI, keeping the chart's aspect ratio
+        dpi = dpi or 100
+        figsize = (width / dpi, width / dpi * figsize[1] / figsize[0])
+    fig = new_figure(figsize, dpi)
+    try:
+        ax = fig.add_subplot()
+        DRAWERS[spec['kind']](ax, data, spec)
+        _decorate(ax, spec)
+        if spec.get('tight_layout'):
+            fig.tight_layout()
+
+        img_buffer = BytesIO()
+        fig.savefig(img_buffer, format=format, dpi='figure', **SAVE_OPTIONS.get(format, {}))
+        return img_buffer.getvalue()
+    finally:
+        # Break the figure/axes/artist reference cycles now instead of waiting for the cyclic GC
+        fig.clear()
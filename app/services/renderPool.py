@@ -0,0 +1,98 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+
+from app import config
+from app.services import plots
+
+
+class RenderPool:
+    # Renders chart specs in worker processes so matplotlib never blocks the event loop and
+    # a crashed or stuck render cannot take the API with it: a crashed pool is replaced on the next
+    # render, and one whose render times out is retired so later renders don't queue behind it.
+    # At most queue_limit renders may be submitted or running at once; beyond that callers get a 503
+    # instead of piling up behind the pool.
+    def __init__(self, workers, queue_limit, timeout):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.pending = 0
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # spawn, not fork: the API process runs an event loop and client threads that must not be copied
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _discard(self, executor):
+        # Only the pool that failed; renders that fail late must not drop its replacement
+        if self._executor is executor:
+            self._executor = None
+
+    def _recycle(self, executor):
+        # A running job cannot be cancelled, so later renders go to a fresh pool rather than queue
+        # behind a stuck one. Renders still queued on the old pool are cancelled and render() resubmits
+        # them; the few it had already handed to its workers cannot be, and finish or time out there.
+        # The old pool exits once those and the stuck render are done.
+        self._discard(executor)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, future):
+        self.pending -= 1
+        # A render whose caller timed out has nobody left to read its outcome
+        if not future.cancelled():
+            future.exception()
+
+    def _submit(self, spec, data, format, width, dpi):
+        executor = self.executor
+        try:
+            job = executor.submit(plots.render_chart, spec, data, format, width, dpi)
+        except BrokenProcessPool:
+            self._discard(executor)
+            executor = self.executor
+            job = executor.submit(plots.render_chart, spec, data, format, width, dpi)
+        future = asyncio.wrap_future(job)
+        # The slot is released when the worker is actually done, not when the caller gives up
+        self.pending += 1
+        future.add_done_callback(self._release)
+        return executor, job, future
+
+    async def render(self, spec, data, format='svg', width=None, dpi=None):
+        if self.pending >= self.queue_limit:
+            raise HTTPException(status_code=503, detail="Chart renderer is busy, please retry",
+                                headers={"Retry-After": "1"})
+
+        while True:
+            executor, job, future = self._submit(spec, data, format, width, dpi)
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except asyncio.CancelledError:
+                # The job was cancelled, not this request: it never started, queued on a pool that another
+                # render's timeout recycled, so it goes again on the new pool with a timeout of its own
+                if job.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+            except asyncio.TimeoutError:
+                # A render still queued is just dropped; a running one is stuck on its worker
+                if not job.cancel() and not job.done():
+                    self._recycle(executor)
+                raise HTTPException(status_code=503, detail="Chart rendering timed out",
+                                    headers={"Retry-After": "5"})
+            except BrokenProcessPool:
+                self._discard(executor)
+                raise HTTPException(status_code=503, detail="Chart renderer restarted, please retry",
+                                    headers={"Retry-After": "1"})
+
+
+render_pool = RenderPool(config.RENDER_WORKERS, config.RENDER_QUEUE_LIMIT, config.RENDER_TIMEOUT)
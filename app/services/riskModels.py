@@ -0,0 +1,156 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from scipy import stats
+
+from app.services.cohorts import cohort_index
+from app.services.datasetCache import dataset_cache, HEART_DISEASE
+from app.services.encoding import AGE_ORDER, binary, ordinal
+from app.services.metrics import cache_lookup, metrics, stage
+
+HEART_DISEASE_RISK = "heart_disease_risk"
+
+
+def heart_disease_features(frame):
+    # '18-24' -> 1 ... '80 or older' -> 13, Male -> 1, plus the intercept column
+    features = pd.DataFrame({
+        'AgeCategory': ordinal(frame['AgeCategory'], AGE_ORDER),
+        'BMI': pd.to_numeric(frame['BMI'], errors='coerce').astype('float64'),
+        'Sex': binary(frame['Sex'], 'Male').astype('float64'),
+    }, index=frame.index)
+    # Same 'const' column sm.add_constant adds, without its per-call constant-column scan
+    features.insert(0, 'const', 1.0)
+    return features
+
+
+def heart_disease_design(frame):
+    X = heart_disease_features(frame)
+    y = binary(frame['HeartDisease']).astype('float64')
+    # Rows with an unknown age category or BMI can't be fitted
+    complete = X.notna().all(axis=1).to_numpy()
+    return X[complete], y[complete]
+
+
+# Which dataset each model is fitted on and how its design matrix is built from a snapshot
+MODELS = {
+    HEART_DISEASE_RISK: {'endpoint': HEART_DISEASE, 'features': heart_disease_features, 'design': heart_disease_design},
+}
+
+
+@dataclass(frozen=True)
+class FittedModel:
+    # Logistic regression fitted on one dataset snapshot; immutable, a refit produces a new one
+    name: str
+    params: pd.Series
+    cov: pd.DataFrame
+    version: str
+    nobs: int
+    iterations: int
+    converged: bool
+    warm_start: bool
+    fit_seconds: float
+
+    @cached_property
+    def coef(self):
+        # Plain float64 vector in design-matrix column order, for scoring
+        return self.params.to_numpy(dtype='float64')
+
+    @property
+    def stderr(self):
+        return pd.Series(np.sqrt(np.diag(self.cov.to_numpy())), index=self.params.index)
+
+    def coefficients(self):
+        z = self.params / self.stderr
+        margin = stats.norm.ppf(0.975) * self.stderr
+        return pd.DataFrame({
+            'term': self.params.index, 'coefficient': self.params.to_numpy(), 'stderr': self.stderr.to_numpy(),
+            'z': z.to_numpy(), 'p_value': 2 * stats.norm.sf(np.abs(z.to_numpy())),
+            'ci_low': (self.params - margin).to_numpy(), 'ci_high': (self.params + margin).to_numpy(),
+        })
+
+    def predict(self, X, interval=False):
+        # P(y = 1) per row of a design matrix; with interval, a 95% band from the delta method on the logit
+        X = X[self.params.index].to_numpy(dtype='float64')
+        logit = X @ self.coef
+        probability = 1 / (1 + np.exp(-logit))
+        if not interval:
+            return probability
+        margin = stats.norm.ppf(0.975) * np.sqrt(np.einsum('ij,jk,ik->i', X, self.cov.to_numpy(), X))
+        return probability, 1 / (1 + np.exp(-(logit - margin))), 1 / (1 + np.exp(-(logit + margin)))
+
+
+def fit_model(name, frame, version, previous=None):
+    X, y = MODELS[name]['design'](frame)
+    # A feature that is constant over the rows (Sex in a single-sex cohort) can't be estimated
+    X = X[[column for column in X.columns if column == 'const' or X[column].nunique() > 1]]
+    # Warm start from the previous snapshot's solution: a refresh moves the optimum only a little,
+    # so Newton converges in a couple of iterations instead of starting from zero
+    start = previous.params.reindex(X.columns, fill_value=0.0).to_numpy() if previous is not None else None
+    started = time.monotonic()
+    result = sm.Logit(y, X).fit(start_params=start, disp=0)
+    return FittedModel(
+        name=name,
+        params=result.params,
+        cov=result.cov_params(),
+        version=version,
+        nobs=int(result.nobs),
+        iterations=int(result.mle_retvals.get('iterations', 0)),
+        converged=bool(result.mle_retvals.get('converged', False)),
+        warm_start=start is not None,
+        fit_seconds=time.monotonic() - started,
+    )
+
+
+class ModelCache:
+    # One fitted model per dataset snapshot. Fits run in a worker thread so the event loop keeps
+    # serving, and concurrent requests for a snapshot that isn't fitted yet share one fit.
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self._models = {}
+        self._inflight = {}
+
+    async def get(self, name, cohort=None):
+        if cohort:
+            entry, index, bits = await cohort_index.select(MODELS[name]['endpoint'], cohort)
+            if bits is not None:
+                cache_lookup("model", "cohort")
+                return await asyncio.shield(self._start_fit(name, entry, cohort, index.mask(bits)))
+        entry = await self.datasets.get(MODELS[name]['endpoint'])
+        model = self._models.get(name)
+        if model is not None and model.version == entry.version:
+            cache_lookup("model", "hit")
+            return model
+        cache_lookup("model", "miss")
+        # Shield so a cancelled caller does not cancel the fit the others are waiting on
+        return await asyncio.shield(self._start_fit(name, entry))
+
+    def _start_fit(self, name, entry, cohort=None, rows=None):
+        key = (name, entry.version, cohort)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fit(name, entry) if rows is None else self._fit_cohort(name, entry, rows))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def _fit(self, name, entry):
+        with stage("transform"):
+            model = await asyncio.to_thread(fit_model, name, entry.frame, entry.version, self._models.get(name))
+        metrics.observe("model_fit_seconds", model.fit_seconds, model=name,
+                        start="warm" if model.warm_start else "cold")
+        self._models[name] = model
+        return model
+
+    async def _fit_cohort(self, name, entry, rows):
+        # Fitted on the cohort's rows alone and not kept: the chart cache holds what is drawn from it.
+        # The whole snapshot's model, if fitted, is a close starting point.
+        with stage("transform"):
+            return await asyncio.to_thread(fit_model, name, entry.frame[rows], entry.version, self._models.get(name))
+
+
+model_cache = ModelCache(dataset_cache)
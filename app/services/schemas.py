@@ -0,0 +1,193 @@
+import asyncio
+from operator import itemgetter
+
+import ijson
+import numpy as np
+import orjson
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from app.services.encoding import bmi_category, codes
+
+# Upstream dataset endpoints
+HEART_DISEASE = "getHeart_disease_analysis"
+LUNG_CANCER = "getLung_cancer_analysis"
+PATIENTS = "getPatients_analysis"
+BLOOD_SUGAR = "getBlood_sugar_analysis"
+
+# Declared column types for the upstream datasets. Low-cardinality text becomes a categorical
+# (one small code per row instead of a Python string), measurements become narrow numerics.
+# Columns not listed here are still loaded; numeric ones are downcast, text stays object.
+
+YES_NO = 'category'
+
+SCHEMAS = {
+    HEART_DISEASE: {
+        'HeartDisease': YES_NO, 'BMI': 'float32', 'Smoking': YES_NO, 'AlcoholDrinking': YES_NO,
+        'Stroke': YES_NO, 'PhysicalHealth': 'int8', 'MentalHealth': 'int8', 'DiffWalking': YES_NO,
+        'Sex': 'category', 'AgeCategory': 'category', 'Race': 'category', 'Diabetic': 'category',
+        'PhysicalActivity': YES_NO, 'GenHealth': 'category', 'SleepTime': 'int8', 'Asthma': YES_NO,
+        'KidneyDisease': YES_NO, 'SkinCancer': YES_NO,
+    },
+    LUNG_CANCER: {
+        'gender': 'category', 'age': 'int16', 'lung_cancer': 'category',
+        # Symptom columns are coded 1 = No, 2 = Yes
+        'smoking': 'int8', 'yellow_fingers': 'int8', 'anxiety': 'int8', 'peer_pressure': 'int8',
+        'chronic_disease': 'int8', 'fatigue': 'int8', 'allergy': 'int8', 'wheezing': 'int8',
+        'alcohol_consuming': 'int8', 'coughing': 'int8', 'shortness_of_breath': 'int8',
+        'swallowing_difficulty': 'int8', 'chest_pain': 'int8',
+    },
+    PATIENTS: {
+        'id': 'int32', 'FName': 'object', 'LName': 'object', 'age': 'int16', 'gender': 'category',
+        'height': 'float32', 'weight': 'float32', 'BloodGroup': 'category',
+        'serum_cholesterol': 'int16', 'fastingbloodsugar': 'int8',
+    },
+    # Month columns are undeclared and downcast like any other numeric column
+    BLOOD_SUGAR: {'id': 'int32'},
+}
+
+# Column each dataset's records are appended in increasing order of (an id or an ISO timestamp).
+# Its maximum is the snapshot's high-water mark for incremental sync; a dataset whose rows lack
+# the column is always reloaded in full.
+SYNC_KEYS = {
+    HEART_DISEASE: 'id',
+    LUNG_CANCER: 'id',
+    PATIENTS: 'id',
+    BLOOD_SUGAR: 'id',
+}
+
+# Labels of integer-coded columns, as the charts show them; cohort filters take either
+YES_NO_CODES = {1: 'No', 2: 'Yes'}
+CODE_LABELS = {
+    LUNG_CANCER: {name: YES_NO_CODES for name, dtype in SCHEMAS[LUNG_CANCER].items() if dtype == 'int8'},
+}
+
+# Columns computed from a dataset's rows, shared by everything that reads them (charts, cubes,
+# correlations, cohort filters). Each is a function of the frame, so it applies to a whole snapshot
+# and to appended rows alike.
+DERIVED_COLUMNS = {
+    HEART_DISEASE: {'BMI_Category': lambda frame: bmi_category(frame['BMI'])},
+    LUNG_CANCER: {
+        # yes -> 2, no -> 1, anything else -> 0, matching the 1/2 coding of the symptom columns
+        'diagnosis': lambda frame: codes(frame['lung_cancer'], ['no', 'yes']) + 1,
+        'smoking_status': lambda frame: frame['smoking'].map(YES_NO_CODES),
+    },
+}
+
+
+def _numbers(values):
+    try:
+        return pd.Series(np.array(values, dtype='float64'))
+    except (TypeError, ValueError):
+        # Nulls or numbers sent as strings take the slower coercing path
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+
+
+def _column(values, dtype):
+    if dtype == 'category':
+        return pd.Categorical(np.array(values, dtype=object))
+    if dtype == 'object':
+        return pd.Series(values, dtype=object)
+    numbers = _numbers(values)
+    if np.dtype(dtype).kind in 'iu':
+        limits = np.iinfo(dtype)
+        if numbers.isna().any():
+            # Missing values have no integer representation
+            return numbers.astype('float32')
+        if numbers.empty or (numbers.min() >= limits.min and numbers.max() <= limits.max):
+            return numbers.astype(dtype)
+        return numbers
+    return numbers.astype(dtype)
+
+
+def _inferred(values):
+    series = pd.Series(values)
+    if series.dtype.kind == 'i':
+        return pd.to_numeric(series, downcast='integer')
+    if series.dtype.kind == 'f':
+        return pd.to_numeric(series, downcast='float')
+    return series
+
+
+def typed_frame(rows, schema):
+    if not isinstance(rows, list) or not rows or not isinstance(rows[0], dict):
+        return pd.DataFrame(rows)
+    # Upstream rows are uniform records, so the first row names every column
+    columns = {}
+    for name in rows[0]:
+        try:
+            values = list(map(itemgetter(name), rows))
+        except KeyError:
+            values = [row.get(name) for row in rows]
+        dtype = schema.get(name)
+        columns[name] = _inferred(values) if dtype is None else _column(values, dtype)
+    return pd.DataFrame(columns)
+
+
+def load_frame(endpoint, content):
+    # Parse the upstream body with orjson and build the typed frame column by column
+    return typed_frame(orjson.loads(content), SCHEMAS.get(endpoint, {}))
+
+
+def _concat(chunks):
+    if len(chunks) == 1:
+        return chunks[0]
+    columns = {}
+    for name in chunks[0].columns:
+        parts = [chunk[name] for chunk in chunks if name in chunk]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            # Chunks saw different levels, so merge their categories instead of falling back to object
+            columns[name] = union_categoricals([part.array for part in parts], sort_categories=True)
+        else:
+            columns[name] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def append_rows(frame, rows):
+    # A new frame with rows after frame's; categorical columns keep one merged set of levels
+    return _concat([frame, rows.reset_index(drop=True)])
+
+
+class FrameBuilder:
+    # Collects parsed rows in bounded batches, converting each full batch to typed columns,
+    # so at most batch_rows Python dicts are alive at any time. The conversions run in a worker
+    # thread, keeping the event loop free while a large dataset loads.
+    def __init__(self, schema, batch_rows):
+        self.schema = schema
+        self.batch_rows = batch_rows
+        self._rows = []
+        self._chunks = []
+
+    async def extend(self, rows):
+        self._rows.extend(rows)
+        if len(self._rows) >= self.batch_rows:
+            await asyncio.to_thread(self._flush)
+
+    def _flush(self):
+        if self._rows:
+            self._chunks.append(typed_frame(self._rows, self.schema))
+            self._rows = []
+
+    def _frame(self):
+        self._flush()
+        return _concat(self._chunks) if self._chunks else pd.DataFrame()
+
+    async def frame(self):
+        return await asyncio.to_thread(self._frame)
+
+
+async def stream_frame(endpoint, chunks, batch_rows=50_000, on_chunk=None):
+    # Incremental parse of a JSON array of records: rows are decoded as body chunks arrive
+    # instead of after the whole body is buffered. on_chunk sees every raw chunk (for hashing).
+    builder = FrameBuilder(SCHEMAS.get(endpoint, {}), batch_rows)
+    rows = ijson.sendable_list()
+    parser = ijson.items_coro(rows, 'item', use_float=True)
+    async for chunk in chunks:
+        if on_chunk is not None:
+            on_chunk(chunk)
+        parser.send(chunk)
+        await builder.extend(rows)
+        del rows[:]
+    parser.close()
+    await builder.extend(rows)
+    return await builder.frame()
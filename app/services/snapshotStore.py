@@ -0,0 +1,62 @@
+import json
+import os
+import time
+
+import pyarrow as pa
+
+# Snapshot metadata kept in the Arrow schema next to the data
+_FIELDS = ("version", "etag", "last_modified", "high_water", "full_synced_at", "saved_at")
+
+
+class SnapshotStore:
+    # Typed dataset snapshots on local disk as uncompressed Arrow IPC files. Loading memory-maps
+    # the file, so numeric columns are read straight from the OS page cache and every worker
+    # process on the machine shares the same pages instead of each holding its own copy.
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, endpoint):
+        return os.path.join(self.directory, f"{endpoint}.arrow")
+
+    def saved_version(self, endpoint):
+        # Reads only the schema, not the data
+        try:
+            with pa.memory_map(self.path(endpoint)) as source:
+                metadata = pa.ipc.open_file(source).schema.metadata or {}
+        except (OSError, pa.ArrowInvalid):
+            return None
+        # Metadata values are JSON, like everything save writes
+        version = metadata.get(b"version")
+        return json.loads(version) if version else None
+
+    def save(self, endpoint, frame, **info):
+        if self.saved_version(endpoint) == info.get("version"):
+            # Another worker already wrote this snapshot
+            return False
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        info = {**info, "saved_at": time.time()}
+        metadata = {**(table.schema.metadata or {}), **{f.encode(): json.dumps(info.get(f)).encode() for f in _FIELDS}}
+        table = table.replace_schema_metadata(metadata)
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Write then rename, so a reader (or a crash) never sees a half-written file
+        partial = f"{self.path(endpoint)}.{os.getpid()}.tmp"
+        with pa.OSFile(partial, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(partial, self.path(endpoint))
+        return True
+
+    def load(self, endpoint):
+        # (frame, info) for the saved snapshot, or None. Numeric columns of the frame are read-only
+        # views over the mapped file; the file may be replaced meanwhile, the mapping stays valid.
+        try:
+            source = pa.memory_map(self.path(endpoint))
+            table = pa.ipc.open_file(source).read_all()
+        except (OSError, pa.ArrowInvalid):
+            return None
+        metadata = table.schema.metadata or {}
+        info = {f: json.loads(metadata[f.encode()]) for f in _FIELDS if f.encode() in metadata}
+        if not info.get("version"):
+            return None
+        return table.to_pandas(split_blocks=True), info
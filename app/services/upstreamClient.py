@@ -0,0 +1,99 @@
+import asyncio
+import random
+from contextlib import asynccontextmanager
+
+import httpx
+
+from app import config
+
+# Statuses worth retrying: the upstream dyno is restarting or overloaded
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class RetryBudget:
+    # Token bucket that caps retries at a fraction of overall traffic, so a struggling
+    # upstream sees at most (1 + ratio) times the normal load instead of a retry storm
+    def __init__(self, ratio, minimum=10):
+        self.ratio = ratio
+        self.maximum = minimum + 100 * ratio
+        self.tokens = float(minimum)
+
+    def deposit(self):
+        self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def withdraw(self):
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class UpstreamClient:
+    # One pooled, keep-alive HTTP/2 client for the app's lifetime instead of a new
+    # connection (and TLS handshake) per request
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.budget = RetryBudget(config.UPSTREAM_RETRY_BUDGET)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=config.UPSTREAM_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=config.UPSTREAM_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.UPSTREAM_MAX_KEEPALIVE,
+                    keepalive_expiry=config.UPSTREAM_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(config.UPSTREAM_READ_TIMEOUT, connect=config.UPSTREAM_CONNECT_TIMEOUT),
+            )
+        return self._client
+
+    async def start(self):
+        return self.client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def post(self, endpoint, headers=None, params=None):
+        return await self._send(endpoint, headers, params, stream=False)
+
+    @asynccontextmanager
+    async def stream(self, endpoint, headers=None, params=None):
+        # Same retry policy as post, but the body is left unread for the caller to consume in chunks
+        response = await self._send(endpoint, headers, params, stream=True)
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def _send(self, endpoint, headers, params, stream):
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                request = self.client.build_request("POST", f"/{endpoint}", headers=headers, params=params)
+                response = await self.client.send(request, stream=stream)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                error = None
+            except httpx.TransportError as e:
+                response, error = None, e
+
+            if attempt >= config.UPSTREAM_MAX_RETRIES or not self.budget.withdraw():
+                if error is not None:
+                    raise error
+                return response
+
+            if response is not None:
+                await response.aclose()
+            # Exponential backoff with full jitter
+            attempt += 1
+            await asyncio.sleep(random.uniform(0, config.UPSTREAM_RETRY_BACKOFF * 2 ** attempt))
+
+
+upstream_client = UpstreamClient(config.UPSTREAM_BASE_URL)
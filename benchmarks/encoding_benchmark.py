@@ -0,0 +1,72 @@
+# Micro-benchmark: row-wise .apply/.map encodings the routers used vs app.services.encoding.
+#
+#   python -m benchmarks.encoding_benchmark [rows]
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from app.services import encoding
+
+
+def categorize_bmi(bmi):
+    if bmi < 18.5:
+        return 'Underweight (0-18.5)'
+    elif 18.5 <= bmi < 24.9:
+        return 'Normal (18.5-24.9)'
+    elif 25 <= bmi < 29.9:
+        return 'Overweight (25-29.9)'
+    elif 30 <= bmi < 34.9:
+        return 'Obese (30-34.9)'
+    else:
+        return 'Severely Obese (35+)'
+
+
+AGE_MAP = {age: i + 1 for i, age in enumerate(encoding.AGE_ORDER)}
+
+
+def synthetic_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'HeartDisease': rng.choice(['Yes', 'No'], rows, p=[0.09, 0.91]),
+        'Sex': rng.choice(['Male', 'Female'], rows),
+        'AgeCategory': rng.choice(encoding.AGE_ORDER, rows),
+        'BMI': np.round(rng.normal(28, 6, rows), 2),
+    }).astype({'HeartDisease': object, 'Sex': object, 'AgeCategory': object})
+
+
+CASES = [
+    ('HeartDisease -> 0/1',
+     lambda df: df['HeartDisease'].apply(lambda x: 1 if x == 'Yes' else 0),
+     lambda df: encoding.binary(df['HeartDisease'])),
+    ('Sex -> 0/1',
+     lambda df: df['Sex'].apply(lambda x: 1 if x == 'Male' else 0),
+     lambda df: encoding.binary(df['Sex'], 'Male')),
+    ('AgeCategory -> ordinal',
+     lambda df: df['AgeCategory'].map(AGE_MAP),
+     lambda df: encoding.ordinal(df['AgeCategory'], encoding.AGE_ORDER)),
+    ('BMI -> category',
+     lambda df: pd.Categorical(df['BMI'].apply(categorize_bmi), categories=encoding.BMI_ORDER, ordered=True),
+     lambda df: encoding.bmi_category(df['BMI'])),
+    ('filter HeartDisease == Yes',
+     lambda df: df[df['HeartDisease'].apply(lambda x: 1 if x == 'Yes' else 0) == 1],
+     lambda df: df[encoding.mask(df['HeartDisease'])]),
+]
+
+
+def best_of(fn, frame, repeat=5):
+    return min(timeit.repeat(lambda: fn(frame), number=1, repeat=repeat))
+
+
+def main(rows):
+    frame = synthetic_frame(rows)
+    print(f"{rows:,} rows")
+    print(f"{'case':<28}{'row-wise ms':>14}{'vectorized ms':>16}{'speedup':>10}")
+    for name, old, new in CASES:
+        before, after = best_of(old, frame), best_of(new, frame)
+        print(f"{name:<28}{before * 1e3:>14.1f}{after * 1e3:>16.1f}{before / after:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000)
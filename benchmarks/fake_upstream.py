@@ -0,0 +1,100 @@
+# Local stand-in for the upstream node backend. It serves the synthetic datasets on the same
+# POST /<endpoint> routes and honours ?since=<id> by returning only records with a larger id.
+# It can also append records on demand, to exercise incremental sync without the live backend.
+#
+# Datasets are kept as batches of ids and each batch is generated (seeded by its first id) while
+# the body streams out, so multi-million-row datasets cost no memory between requests.
+#
+#   python -m benchmarks.fake_upstream [heart_rows] [port] [lung_rows] [patient_rows]
+#   UPSTREAM_BASE_URL=http://127.0.0.1:8765 DATASET_INCREMENTAL=true uvicorn app.main:app
+#   curl -X POST 'http://127.0.0.1:8765/_append/getHeart_disease_analysis?rows=1000'
+#   curl http://127.0.0.1:8765/_stats
+import sys
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.services.schemas import HEART_DISEASE, LUNG_CANCER, PATIENTS, BLOOD_SUGAR
+from benchmarks.synthetic import FRAMES, records_body
+
+BATCH_ROWS = 50_000
+
+
+def id_batches(start, rows):
+    # (first id, rows) for ids start .. start + rows - 1
+    return [(first, min(BATCH_ROWS, start + rows - first)) for first in range(start, start + rows, BATCH_ROWS)]
+
+
+class FakeUpstream:
+    def __init__(self, sizes):
+        self.batches = {endpoint: id_batches(1, rows) for endpoint, rows in sizes.items()}
+        self.stats = {endpoint: {"calls": 0, "rows": 0, "bytes": 0} for endpoint in sizes}
+
+    def rows(self, endpoint):
+        return sum(rows for _, rows in self.batches[endpoint])
+
+    def chunks(self, endpoint, since=None):
+        # The JSON array, one chunk per batch of records
+        stats = self.stats[endpoint]
+        stats["calls"] += 1
+        separator = b"["
+        for first, rows in list(self.batches[endpoint]):
+            if since is not None and first + rows - 1 <= since:
+                continue
+            frame = FRAMES[endpoint](rows, seed=first, start=first)
+            if since is not None:
+                frame = frame[frame['id'] > since]
+                if frame.empty:
+                    continue
+            chunk = separator + records_body(frame)[1:-1]
+            separator = b","
+            stats["rows"] += len(frame)
+            stats["bytes"] += len(chunk)
+            yield chunk
+        yield b"[]" if separator == b"[" else b"]"
+
+    def append(self, endpoint, rows):
+        start = sum(self.batches[endpoint][-1]) if self.batches[endpoint] else 1
+        self.batches[endpoint] += id_batches(start, rows)
+        return start, start + rows - 1
+
+
+def create_app(sizes):
+    upstream = FakeUpstream(sizes)
+    app = FastAPI()
+    app.state.upstream = upstream
+
+    @app.post("/{endpoint}")
+    async def dataset(endpoint: str, since: Optional[float] = None):
+        if endpoint not in upstream.batches:
+            raise HTTPException(status_code=404, detail=f"Unknown dataset {endpoint}")
+        return StreamingResponse(upstream.chunks(endpoint, since), media_type="application/json")
+
+    @app.post("/_append/{endpoint}")
+    async def append(endpoint: str, rows: int = Query(1000, ge=1)):
+        if endpoint not in upstream.batches:
+            raise HTTPException(status_code=404, detail=f"Unknown dataset {endpoint}")
+        first, last = upstream.append(endpoint, rows)
+        return {"endpoint": endpoint, "first_id": first, "last_id": last, "total": upstream.rows(endpoint)}
+
+    @app.get("/_stats")
+    async def stats():
+        return upstream.stats
+
+    return app
+
+
+def dataset_sizes(heart_rows, lung_rows=300, patient_rows=1_000):
+    # Patients and their blood sugar readings share ids, so both get patient_rows
+    return {HEART_DISEASE: heart_rows, LUNG_CANCER: lung_rows, PATIENTS: patient_rows, BLOOD_SUGAR: patient_rows}
+
+
+def main(sizes, port):
+    uvicorn.run(create_app(sizes), host="127.0.0.1", port=port, log_level="warning")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(dataset_sizes(args[0] if args else 50_000, *args[2:4]), args[1] if len(args) > 1 else 8765)
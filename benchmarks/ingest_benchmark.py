@@ -0,0 +1,45 @@
+# Micro-benchmark: pd.DataFrame(response.json()) vs the typed orjson loader in app.services.schemas,
+# on a synthetic heart-disease body. Also reports frame memory and a typical group-by.
+#
+#   python -m benchmarks.ingest_benchmark [rows]
+import json
+import sys
+import timeit
+
+import pandas as pd
+
+from app.services.schemas import HEART_DISEASE, load_frame
+from benchmarks.synthetic import heart_disease_body
+
+
+def untyped(content):
+    return pd.DataFrame(json.loads(content))
+
+
+def typed(content):
+    return load_frame(HEART_DISEASE, content)
+
+
+def group_by(frame):
+    return frame.groupby(['AgeCategory', 'HeartDisease'], observed=True)['SleepTime'].mean()
+
+
+def best_of(fn, arg, repeat=3):
+    return min(timeit.repeat(lambda: fn(arg), number=1, repeat=repeat))
+
+
+def main(rows):
+    content = heart_disease_body(rows)
+    before, after = untyped(content), typed(content)
+    print(f"{rows:,} rows, {len(content) / 1e6:.1f} MB body")
+    print(f"{'':<22}{'DataFrame(json)':>18}{'typed loader':>16}{'ratio':>9}")
+    parse_before, parse_after = best_of(untyped, content), best_of(typed, content)
+    print(f"{'parse ms':<22}{parse_before * 1e3:>18.1f}{parse_after * 1e3:>16.1f}{parse_before / parse_after:>8.1f}x")
+    mem_before, mem_after = before.memory_usage(deep=True).sum(), after.memory_usage(deep=True).sum()
+    print(f"{'frame MB':<22}{mem_before / 1e6:>18.1f}{mem_after / 1e6:>16.1f}{mem_before / mem_after:>8.1f}x")
+    group_before, group_after = best_of(group_by, before), best_of(group_by, after)
+    print(f"{'group-by ms':<22}{group_before * 1e3:>18.1f}{group_after * 1e3:>16.1f}{group_before / group_after:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000)
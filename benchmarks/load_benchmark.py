@@ -0,0 +1,290 @@
+# Throughput of every route in app/routes_and_controllers under concurrent load, against
+# benchmarks.fake_upstream instead of the live backend. For each heart-disease size the upstream
+# and the service (uvicorn, one worker) are started fresh, every route is hit by --concurrency
+# clients for --duration seconds, and latency percentiles, requests per second and the peak RSS of
+# the service (render workers included, read from /proc, so Linux only) are recorded per route.
+#
+# Results are saved as JSON (benchmarks/results/<time>-<commit>.json by default); pass an earlier
+# file as --compare to print the change in p50 latency and RPS per route. The load generator
+# shares the machine with the service, so compare runs made on the same host.
+#
+#   python -m benchmarks.load_benchmark [--rows 10000 100000 1000000 5000000] [--concurrency 8]
+#       [--duration 5] [--bypass-cache] [--output results.json] [--compare previous.json]
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import pkgutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+from fastapi.routing import APIRoute
+
+UPSTREAM_PORT = 8791
+SERVICE_PORT = 8792
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Inputs for routes that need more than their defaults; other path parameters come from PATH_PARAMS
+PATH_PARAMS = {"patient_id": "1"}
+REQUESTS = {
+    "/factorsOfHeartDiseases/model/predict": {"params": {"AgeCategory": "55-59", "BMI": 28.5, "Sex": "Male"}},
+    "/factorsOfHeartDiseases/score": {"json": [{"AgeCategory": age, "BMI": 18.5 + i % 20, "Sex": sex}
+                                               for i, (age, sex) in enumerate([("40-44", "Female"), ("65-69", "Male")]
+                                                                              * 50)]},
+}
+
+
+def service_routes():
+    # (method, path) of every route the routers in app/routes_and_controllers declare. Routes are
+    # picked by router, not by handler module: registry charts are handlers built in app.services.
+    from app import routes_and_controllers
+    from app.main import app
+    from app.services.chartRegistry import chart_registry
+    endpoints = set()
+    for module in pkgutil.iter_modules(routes_and_controllers.__path__):
+        router = getattr(importlib.import_module(f"app.routes_and_controllers.{module.name}"), "router", None)
+        if router is not None:
+            endpoints.update(route.endpoint for route in router.routes if isinstance(route, APIRoute))
+    routes = []
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.endpoint in endpoints:
+            routes += [(method, route.path.format(**PATH_PARAMS)) for method in sorted(route.methods)]
+    missing = [chart.path for chart in chart_registry.charts
+               if not any(path.endswith(chart.path) for method, path in routes if method == "GET")]
+    if missing:
+        raise RuntimeError(f"Registered charts without a route to drive: {', '.join(missing)}")
+    return routes
+
+
+def descendants(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            pids = [int(child) for child in children.read().split()]
+    except FileNotFoundError:
+        return []
+    return pids + [grandchild for child in pids for grandchild in descendants(child)]
+
+
+def tree_rss(pid):
+    # Resident bytes of a process and all of its descendants
+    total = 0
+    for process in [pid, *descendants(pid)]:
+        try:
+            with open(f"/proc/{process}/statm") as statm:
+                total += int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except FileNotFoundError:
+            pass
+    return total
+
+
+class RssSampler:
+    # Polls the service's RSS from a thread while a route is under load
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, tree_rss(self.pid))
+            self._stop.wait(self.interval)
+
+
+def start(args, env=None):
+    return subprocess.Popen([sys.executable, "-m", *args], env={**os.environ, **(env or {})})
+
+
+def stop(process):
+    # Render workers can outlive a terminated server, so they are stopped along with it
+    children = descendants(process.pid)
+    process.terminate()
+    process.wait()
+    for child in children:
+        try:
+            os.kill(child, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def wait_until(check, timeout, what):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{what} not ready after {timeout}s")
+
+
+def datasets_loaded():
+    status = httpx.get(f"http://127.0.0.1:{SERVICE_PORT}/datasets/status", timeout=5).json()
+    return all(dataset["loaded"] for dataset in status["datasets"].values())
+
+
+async def drive(client, method, path, concurrency, duration):
+    # Closed loop: each client sends its next request as soon as the previous one is answered
+    options = REQUESTS.get(path, {})
+    latencies, statuses, sizes = [], {}, []
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.request(method, path, params=options.get("params"), json=options.get("json"))
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            sizes.append(len(response.content))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, sizes, time.perf_counter() - started
+
+
+async def run_routes(routes, pid, concurrency, duration):
+    results = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{SERVICE_PORT}", limits=limits,
+                                 timeout=300) as client:
+        for method, path in routes:
+            # The first request fills the caches behind the route; it is reported on its own
+            started = time.perf_counter()
+            first = await client.request(method, path, params=REQUESTS.get(path, {}).get("params"),
+                                         json=REQUESTS.get(path, {}).get("json"))
+            first_ms = (time.perf_counter() - started) * 1000
+            with RssSampler(pid) as rss:
+                latencies, statuses, sizes, elapsed = await drive(client, method, path, concurrency, duration)
+            ms = np.array(latencies) * 1000
+            ok = statuses.get(200, 0)
+            results[f"{method} {path}"] = {
+                "first_status": first.status_code,
+                "first_ms": round(first_ms, 2),
+                "requests": len(latencies),
+                "statuses": {str(status): count for status, count in sorted(statuses.items())},
+                "rps": round(ok / elapsed, 2),
+                "p50_ms": round(float(np.percentile(ms, 50)), 2),
+                "p90_ms": round(float(np.percentile(ms, 90)), 2),
+                "p99_ms": round(float(np.percentile(ms, 99)), 2),
+                "max_ms": round(float(ms.max()), 2),
+                "mean_bytes": int(np.mean(sizes)),
+                "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+            }
+            row = results[f"{method} {path}"]
+            print(f"  {method:<4} {path:<72} {row['rps']:>8.1f} rps  p50 {row['p50_ms']:>8.1f}  "
+                  f"p99 {row['p99_ms']:>8.1f} ms  {row['peak_rss_mb']:>7.1f} MB"
+                  + ("" if set(statuses) == {200} else f"  {row['statuses']}"))
+    return results
+
+
+def run_size(rows, routes, args):
+    print(f"{rows} heart disease rows")
+    upstream = start(["benchmarks.fake_upstream", str(rows), str(UPSTREAM_PORT), str(args.lung_rows),
+                      str(args.patient_rows)])
+    service = None
+    try:
+        wait_until(lambda: httpx.get(f"http://127.0.0.1:{UPSTREAM_PORT}/_stats", timeout=5).is_success, 60,
+                   "fake upstream")
+        started = time.monotonic()
+        # No snapshot directory, so each size starts from the upstream rather than from disk
+        environment = {"UPSTREAM_BASE_URL": f"http://127.0.0.1:{UPSTREAM_PORT}", "DATASET_SNAPSHOT_DIR": "",
+                       "DATASET_REFRESH_ENABLED": "true", "DATASET_CACHE_TTL": "86400",
+                       "DATASET_REFRESH_INTERVAL": "86400"}
+        if args.bypass_cache:
+            # A chart cache that holds nothing: charts render on every request, though concurrent
+            # identical requests still share one render, as they would in production
+            environment["CHART_CACHE_MAX_ENTRIES"] = "0"
+        service = start(["uvicorn", "app.main:app", "--port", str(SERVICE_PORT), "--log-level", "warning"],
+                        environment)
+        wait_until(datasets_loaded, 1800, "service")
+        ready_seconds = time.monotonic() - started
+        print(f"  ready in {ready_seconds:.1f}s, {tree_rss(service.pid) / 2 ** 20:.0f} MB")
+        results = asyncio.run(run_routes(routes, service.pid, args.concurrency, args.duration))
+    finally:
+        for process in (service, upstream):
+            if process is not None:
+                stop(process)
+    return {"ready_seconds": round(ready_seconds, 2), "routes": results}
+
+
+def compare(current, previous):
+    print(f"\nChange from {previous['commit']} ({previous['started']})")
+    for rows, run in current["runs"].items():
+        before = previous["runs"].get(rows)
+        if before is None:
+            continue
+        print(f"{rows} heart disease rows")
+        for route, row in run["routes"].items():
+            old = before["routes"].get(route)
+            if old is None or not old["rps"] or not old["p50_ms"]:
+                continue
+            print(f"  {route:<77} rps {(row['rps'] / old['rps'] - 1) * 100:>+7.1f}%  "
+                  f"p50 {(row['p50_ms'] / old['p50_ms'] - 1) * 100:>+7.1f}%")
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000],
+                        help="heart disease rows; the whole suite runs once per size")
+    parser.add_argument("--lung-rows", type=int, default=300)
+    parser.add_argument("--patient-rows", type=int, default=1_000, help="patients, and blood sugar rows")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5, help="seconds of load per route")
+    parser.add_argument("--bypass-cache", action="store_true", help="run the service with the chart cache disabled")
+    parser.add_argument("--routes", nargs="*", help="only routes whose path contains one of these")
+    parser.add_argument("--output")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    routes = service_routes()
+    if args.routes:
+        routes = [(method, path) for method, path in routes if any(part in path for part in args.routes)]
+    started = datetime.now(timezone.utc)
+    results = {
+        "commit": git_commit(),
+        "started": started.isoformat(timespec="seconds"),
+        "settings": {"concurrency": args.concurrency, "duration": args.duration, "bypass_cache": args.bypass_cache,
+                     "lung_rows": args.lung_rows, "patient_rows": args.patient_rows, "cpus": os.cpu_count()},
+        "runs": {str(rows): run_size(rows, routes, args) for rows in args.rows},
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{started:%Y%m%dT%H%M%S}-{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nSaved {output}")
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Bytes and render time per chart route for each output pipeline: SVG with text drawn as glyph
+# paths (the old output), SVG with text kept as text, that SVG gzip/brotli-compressed, and
+# PNG/WebP at a fixed pixel width.
+#
+# Routes run in-process against synthetic datasets; the render pool is swapped for a recorder
+# so each route's (spec, data) is captured once and rendered here in the current process.
+#
+#   python -m benchmarks.output_benchmark [heart_rows] [width]
+import asyncio
+import gzip
+import hashlib
+import sys
+import time
+
+import brotli
+import httpx
+import matplotlib
+
+from app.main import app
+from app.services import chartOutput, plots
+from app.services.datasetCache import CachedDataset, dataset_cache
+from app.services.schemas import load_frame
+from benchmarks.synthetic import bodies
+
+
+class Recorder:
+    def __init__(self):
+        self.charts = {}
+        self.path = None
+
+    async def render(self, spec, data, *args):
+        self.charts[self.path] = (spec, data)
+        return b""
+
+
+def load_datasets(heart_rows):
+    for endpoint, body in bodies(heart_rows).items():
+        dataset_cache._entries[endpoint] = CachedDataset(
+            frame=load_frame(endpoint, body), version=hashlib.sha256(body).hexdigest(), fetched_at=time.monotonic())
+    dataset_cache.ttl = float("inf")
+
+
+async def capture():
+    recorder = Recorder()
+    chartOutput.render_pool = recorder
+    paths = [route.path.replace("{patient_id}", "5") for route in app.routes if hasattr(route.endpoint, "chart_datasets")]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for path in paths:
+            recorder.path = path
+            await client.get(path)
+    return recorder.charts
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1e3
+
+
+def measure(spec, data, width):
+    with matplotlib.rc_context({'svg.fonttype': 'path'}):
+        glyphs, glyph_ms = timed(lambda: plots.render_chart(spec, data, 'svg'))
+    svg, svg_ms = timed(lambda: plots.render_chart(spec, data, 'svg'))
+    png, png_ms = timed(lambda: plots.render_chart(spec, data, 'png', width))
+    webp, webp_ms = timed(lambda: plots.render_chart(spec, data, 'webp', width))
+    return [
+        (len(glyphs), glyph_ms), (len(svg), svg_ms),
+        (len(gzip.compress(svg, 6)), None), (len(brotli.compress(svg, quality=9)), None),
+        (len(png), png_ms), (len(webp), webp_ms),
+    ]
+
+
+def main(heart_rows, width):
+    load_datasets(heart_rows)
+    charts = asyncio.run(capture())
+    columns = ['svg paths', 'svg text', 'svg gzip', 'svg br', f'png {width}', f'webp {width}']
+    print(f"KB (ms to render); {heart_rows:,} heart-disease rows")
+    print(f"{'route':<58}" + "".join(f"{name:>16}" for name in columns))
+    totals = [[0, 0.0] for _ in columns]
+    for path, (spec, data) in charts.items():
+        cells = []
+        for total, (size, ms) in zip(totals, measure(spec, data, width)):
+            total[0] += size
+            total[1] += ms or 0
+            cells.append(f"{size / 1024:.1f}" + (f" ({ms:.0f})" if ms is not None else ""))
+        print(f"{path[-57:]:<58}" + "".join(f"{cell:>16}" for cell in cells))
+    print(f"{'total':<58}" + "".join(f"{size / 1024:>9.0f}" + (f" ({ms:.0f})" if ms else "      ")
+                                      for size, ms in totals))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000, int(sys.argv[2]) if len(sys.argv) > 2 else 800)
@@ -0,0 +1,50 @@
+# Soak test for the chart renderer: renders every chart route's spec over and over, in the
+# current process, cycling through svg/png/webp, with one render in ten failing halfway through
+# drawing. Resident memory and pyplot's open-figure count are printed at intervals and should
+# stay flat once the first pass has warmed matplotlib's font and path caches.
+#
+#   python -m benchmarks.render_soak [renders] [heart_rows]
+import asyncio
+import os
+import resource
+import sys
+import time
+
+import matplotlib.pyplot as plt
+
+from app.services import plots
+from benchmarks.output_benchmark import capture, load_datasets
+
+FORMATS = ['svg', 'png', 'webp']
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        # No procfs: fall back to the peak, which at least can't hide growth
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+def main(renders, heart_rows):
+    load_datasets(heart_rows)
+    charts = list(asyncio.run(capture()).values())
+    broken = {'kind': 'bar', 'x': 'missing', 'y': 'missing', 'title': 'broken'}
+    print(f"{renders:,} renders of {len(charts)} charts")
+    print(f"{'renders':>10}{'RSS MB':>10}{'figures':>10}{'failed':>10}{'renders/s':>12}")
+
+    failed, started, interval = 0, time.perf_counter(), max(renders // 20, 1)
+    for i in range(1, renders + 1):
+        spec, data = charts[i % len(charts)]
+        try:
+            plots.render_chart(broken if i % 10 == 0 else spec, data, FORMATS[i % len(FORMATS)], width=400)
+        except Exception:
+            failed += 1
+        if i % interval == 0 or i == renders:
+            rate = i / (time.perf_counter() - started)
+            print(f"{i:>10,}{rss_mb():>10.1f}{len(plt.get_fignums()):>10}{failed:>10,}{rate:>12.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000, int(sys.argv[2]) if len(sys.argv) > 2 else 10_000)
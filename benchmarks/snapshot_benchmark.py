@@ -0,0 +1,90 @@
+# Startup and first-request latency with and without the on-disk snapshot store. Each run is a
+# fresh Python process against benchmarks.fake_upstream: "cold" starts with an empty snapshot
+# directory and has to pull every dataset from the upstream, "warm" restores what the cold run
+# saved. A run with DATASET_SNAPSHOT_DIR unset is the behaviour before the store existed.
+#
+#   python -m benchmarks.snapshot_benchmark [heart_rows] [runs]
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+PORT = 8767
+FIRST_REQUEST = "/heartDisease/countDiseases?format=json"
+
+
+async def child():
+    # One startup: import, lifespan, then the first request; timings as JSON on the last line
+    started = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            response = await client.get(FIRST_REQUEST)
+            response.raise_for_status()
+        answered = time.perf_counter()
+    print(json.dumps({"import": imported - started, "startup": ready - imported,
+                      "first_request": answered - ready, "total": answered - started}))
+
+
+def run_child(snapshot_dir):
+    env = {**os.environ, "UPSTREAM_BASE_URL": f"http://127.0.0.1:{PORT}", "DATASET_SNAPSHOT_DIR": snapshot_dir}
+    output = subprocess.run([sys.executable, "-m", "benchmarks.snapshot_benchmark", "--child"], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def wait_for_upstream():
+    for _ in range(600):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/_stats", timeout=1).raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("fake upstream did not start")
+
+
+def report(label, runs):
+    cells = [f"{statistics.median(run[field] for run in runs) * 1000:9.0f}"
+             for field in ("import", "startup", "first_request", "total")]
+    print(f"{label:<16}" + "".join(cells))
+
+
+def main(heart_rows, runs):
+    upstream = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_upstream", str(heart_rows), str(PORT)])
+    try:
+        wait_for_upstream()
+        with tempfile.TemporaryDirectory() as directory:
+            snapshots = os.path.join(directory, "snapshots")
+            no_store, cold, warm = [], [], []
+            for _ in range(runs):
+                no_store.append(run_child(""))
+                # The cold run saves the snapshots the warm run then restores
+                for name in os.listdir(snapshots) if os.path.isdir(snapshots) else []:
+                    os.remove(os.path.join(snapshots, name))
+                cold.append(run_child(snapshots))
+                warm.append(run_child(snapshots))
+            size = sum(os.path.getsize(os.path.join(snapshots, name)) for name in os.listdir(snapshots))
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+    print(f"{heart_rows} heart disease rows, median of {runs} runs, {size / 1e6:.1f} MB of snapshots")
+    print(f"{'':<16}{'import':>9}{'startup':>9}{'first':>9}{'total':>9}  (ms)")
+    report("no store", no_store)
+    report("cold snapshot", cold)
+    report("warm snapshot", warm)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ["--child"]:
+        asyncio.run(child())
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000, int(sys.argv[2]) if len(sys.argv) > 2 else 3)
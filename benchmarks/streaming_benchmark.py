@@ -0,0 +1,61 @@
+# Peak memory and time of the three ways a heart-disease body can be turned into a frame:
+# the original buffered pd.DataFrame(response.json()), the buffered typed orjson loader, and
+# the streaming parser fed 64 KB chunks the way httpx's aiter_bytes delivers them.
+#
+#   python -m benchmarks.streaming_benchmark [rows]
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from app.services.schemas import HEART_DISEASE, load_frame, stream_frame
+from benchmarks.synthetic import heart_disease_body
+
+CHUNK = 64 * 1024
+
+
+def buffered_untyped(body):
+    content = bytes(body)  # response.content
+    return pd.DataFrame(json.loads(content))
+
+
+def buffered_typed(body):
+    content = bytes(body)
+    return load_frame(HEART_DISEASE, content)
+
+
+def streaming(body):
+    async def chunks():
+        for start in range(0, len(body), CHUNK):
+            yield body[start:start + CHUNK]
+
+    return asyncio.run(stream_frame(HEART_DISEASE, chunks()))
+
+
+def measure(fn, body):
+    # Timed untraced first, since tracemalloc slows allocation-heavy code several-fold
+    started = time.perf_counter()
+    fn(body)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    frame = fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, frame.memory_usage(deep=True).sum()
+
+
+def main(rows):
+    body = memoryview(heart_disease_body(rows))
+    print(f"{rows:,} rows, {len(body) / 1e6:.1f} MB body")
+    print(f"{'loader':<28}{'seconds':>10}{'peak MB':>10}{'frame MB':>10}")
+    for name, fn in [('DataFrame(response.json())', buffered_untyped), ('orjson typed (buffered)', buffered_typed),
+                     ('ijson typed (streaming)', streaming)]:
+        elapsed, peak, size = measure(fn, body)
+        print(f"{name:<28}{elapsed:>10.2f}{peak / 1e6:>10.1f}{size / 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000)
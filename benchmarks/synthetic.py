@@ -0,0 +1,98 @@
+# Synthetic upstream bodies shaped like the four analysis feeds, shared by the benchmarks.
+import numpy as np
+import pandas as pd
+
+from app.services import encoding
+from app.services.schemas import HEART_DISEASE, LUNG_CANCER, PATIENTS, BLOOD_SUGAR
+
+LUNG_SYMPTOMS = ['smoking', 'yellow_fingers', 'anxiety', 'peer_pressure', 'chronic_disease', 'fatigue', 'allergy',
+                 'wheezing', 'alcohol_consuming', 'coughing', 'shortness_of_breath', 'swallowing_difficulty',
+                 'chest_pain']
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+def records_body(frame):
+    # pandas' own encoder: the same records as json.dumps(to_dict(...)), several times faster
+    return frame.to_json(orient='records').encode()
+
+
+# Each *_frame builds `rows` records with ids start, start + 1, ...; *_body is the same as upstream JSON
+def heart_disease_frame(rows, seed=0, start=1):
+    rng = np.random.default_rng(seed)
+
+    def yes_no(p):
+        return np.where(rng.random(rows) < p, 'Yes', 'No')
+
+    return pd.DataFrame({
+        'id': np.arange(start, start + rows), 'HeartDisease': yes_no(0.09),
+        'BMI': np.round(rng.normal(28, 6, rows), 2), 'Smoking': yes_no(0.41),
+        'AlcoholDrinking': yes_no(0.07), 'Stroke': yes_no(0.04), 'PhysicalHealth': rng.integers(0, 31, rows),
+        'MentalHealth': rng.integers(0, 31, rows), 'DiffWalking': yes_no(0.14),
+        'Sex': rng.choice(['Male', 'Female'], rows), 'AgeCategory': rng.choice(encoding.AGE_ORDER, rows),
+        'Race': rng.choice(['White', 'Black', 'Asian', 'Hispanic', 'Other'], rows),
+        'Diabetic': rng.choice(['No', 'Yes', 'No, borderline diabetes'], rows, p=[0.85, 0.13, 0.02]),
+        'PhysicalActivity': yes_no(0.78), 'GenHealth': rng.choice(['Excellent', 'Very good', 'Good', 'Fair', 'Poor'], rows),
+        'SleepTime': rng.integers(1, 15, rows), 'Asthma': yes_no(0.13), 'KidneyDisease': yes_no(0.04),
+        'SkinCancer': yes_no(0.09),
+    })
+
+
+def lung_cancer_frame(rows, seed=0, start=1):
+    rng = np.random.default_rng(seed)
+    columns = {'id': np.arange(start, start + rows), 'gender': rng.choice(['M', 'F'], rows),
+               'age': rng.integers(30, 86, rows), 'lung_cancer': rng.choice(['yes', 'no'], rows, p=[0.87, 0.13])}
+    columns.update({symptom: rng.integers(1, 3, rows) for symptom in LUNG_SYMPTOMS})
+    return pd.DataFrame(columns)
+
+
+def patients_frame(rows, seed=0, start=1):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(start, start + rows)
+    return pd.DataFrame({
+        'id': ids, 'FName': [f"First{i}" for i in ids], 'LName': [f"Last{i}" for i in ids],
+        'age': rng.integers(20, 91, rows), 'gender': rng.choice(['Male', 'Female'], rows),
+        'height': rng.integers(150, 196, rows), 'weight': rng.integers(45, 121, rows),
+        'BloodGroup': rng.choice(['A+', 'A-', 'B+', 'O+', 'O-', 'AB+'], rows),
+        'serum_cholesterol': rng.choice([0, 180, 220, 260], rows), 'fastingbloodsugar': rng.integers(0, 2, rows),
+    })
+
+
+def blood_sugar_frame(rows, seed=0, start=1):
+    rng = np.random.default_rng(seed)
+    columns = {'id': np.arange(start, start + rows)}
+    columns.update({month: rng.integers(70, 201, rows) for month in MONTHS})
+    return pd.DataFrame(columns)
+
+
+FRAMES = {
+    HEART_DISEASE: heart_disease_frame,
+    LUNG_CANCER: lung_cancer_frame,
+    PATIENTS: patients_frame,
+    BLOOD_SUGAR: blood_sugar_frame,
+}
+
+
+def heart_disease_body(rows, seed=0):
+    return records_body(heart_disease_frame(rows, seed))
+
+
+def lung_cancer_body(rows, seed=0):
+    return records_body(lung_cancer_frame(rows, seed))
+
+
+def patients_body(rows, seed=0):
+    return records_body(patients_frame(rows, seed))
+
+
+def blood_sugar_body(rows, seed=0):
+    return records_body(blood_sugar_frame(rows, seed))
+
+
+def bodies(heart_rows=50_000, lung_rows=300, patient_rows=1_000):
+    # Upstream endpoint -> JSON body
+    return {
+        HEART_DISEASE: heart_disease_body(heart_rows),
+        LUNG_CANCER: lung_cancer_body(lung_rows),
+        PATIENTS: patients_body(patient_rows),
+        BLOOD_SUGAR: blood_sugar_body(patient_rows),
+    }
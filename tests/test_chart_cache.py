@@ -0,0 +1,226 @@
+import asyncio
+import gzip
+from contextlib import asynccontextmanager
+
+import brotli
+import httpx
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.main import app as service
+from app.services.chartCache import ChartCache, cached_chart, chart_cache
+from app.services.datasetCache import dataset_cache
+
+
+class Render:
+    # A render that waits to be released, counting how often it started and how it ended
+    def __init__(self, result='chart', error=None):
+        self.result = result
+        self.error = error
+        self.release = asyncio.Event()
+        self.calls = 0
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_identical_requests_share_one_render():
+    async def run():
+        cache, render = ChartCache(8, 1 << 20), Render()
+        waiters = [asyncio.ensure_future(cache.coalesce('key', render)) for _ in range(5)]
+        await settle()
+        render.release.set()
+        assert await asyncio.gather(*waiters) == ['chart'] * 5
+        assert render.calls == 1
+        assert not cache._inflight
+
+    asyncio.run(run())
+
+
+def test_different_keys_render_separately():
+    async def run():
+        cache, first, second = ChartCache(8, 1 << 20), Render('a'), Render('b')
+        waiters = [asyncio.ensure_future(cache.coalesce('a', first)),
+                   asyncio.ensure_future(cache.coalesce('b', second))]
+        await settle()
+        first.release.set()
+        second.release.set()
+        assert await asyncio.gather(*waiters) == ['a', 'b']
+
+    asyncio.run(run())
+
+
+def test_an_error_reaches_every_waiter_and_is_not_kept():
+    async def run():
+        cache, render = ChartCache(8, 1 << 20), Render(error=ValueError('bad data'))
+        waiters = [asyncio.ensure_future(cache.coalesce('key', render)) for _ in range(3)]
+        await settle()
+        render.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        # The next request renders afresh
+        retry = Render()
+        retry.release.set()
+        assert await cache.coalesce('key', retry) == 'chart'
+        assert (render.calls, retry.calls) == (1, 1)
+
+    asyncio.run(run())
+
+
+def test_cancelled_leader_leaves_the_render_to_the_others():
+    async def run():
+        cache, render = ChartCache(8, 1 << 20), Render()
+        leader = asyncio.ensure_future(cache.coalesce('key', render))
+        await settle()
+        followers = [asyncio.ensure_future(cache.coalesce('key', render)) for _ in range(2)]
+        await settle()
+        leader.cancel()
+        await settle()
+        assert not render.cancelled
+        render.release.set()
+        assert await asyncio.gather(*followers) == ['chart', 'chart']
+        assert render.calls == 1
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(run())
+
+
+def test_request_after_everyone_left_starts_a_new_render():
+    async def run():
+        cache, abandoned, fresh = ChartCache(8, 1 << 20), Render(), Render()
+        waiter = asyncio.ensure_future(cache.coalesce('key', abandoned))
+        await settle()
+        waiter.cancel()
+        # The abandoned render is cancelled but has not finished yet when the next request arrives
+        await asyncio.sleep(0)
+        late = asyncio.ensure_future(cache.coalesce('key', fresh))
+        await settle()
+        fresh.release.set()
+        assert await late == 'chart'
+        assert abandoned.cancelled
+        assert (abandoned.calls, fresh.calls) == (1, 1)
+
+    asyncio.run(run())
+
+
+def test_render_is_cancelled_once_nobody_waits():
+    async def run():
+        cache, render = ChartCache(8, 1 << 20), Render()
+        waiters = [asyncio.ensure_future(cache.coalesce('key', render)) for _ in range(3)]
+        await settle()
+        for waiter in waiters:
+            waiter.cancel()
+        await settle()
+        assert render.cancelled
+        assert not cache._inflight
+
+    asyncio.run(run())
+
+
+def chart_app(media_type, content):
+    # One cached chart route drawn from no dataset, counting how often it renders
+    chart_cache.clear()
+    app = FastAPI()
+    app.state.renders = 0
+    path = '/chart'
+
+    @app.get(path)
+    @cached_chart()
+    async def chart():
+        app.state.renders += 1
+        return Response(content=content, media_type=media_type)
+
+    return app, path
+
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg">' + b'<path d="M0 0L1 1"/>' * 200 + b'</svg>'
+
+
+def test_conditional_requests_get_304():
+    app, path = chart_app('image/svg+xml', SVG)
+    client = TestClient(app)
+    plain = {'Accept-Encoding': 'identity'}
+    first = client.get(path, headers=plain)
+    etag = first.headers['etag']
+    assert (first.status_code, first.content) == (200, SVG)
+    assert first.headers['cache-control'] == 'no-cache'
+    assert first.headers['vary'] == 'Accept-Encoding'
+
+    for header in (etag, 'W/' + etag, '"other", ' + etag, '*'):
+        revalidated = client.get(path, headers={**plain, 'If-None-Match': header})
+        assert (revalidated.status_code, revalidated.content) == (304, b'')
+        assert revalidated.headers['etag'] == etag
+    assert client.get(path, headers={**plain, 'If-None-Match': '"other"'}).status_code == 200
+    assert app.state.renders == 1
+
+
+@pytest.mark.parametrize('encoding, decode', [('br', brotli.decompress), ('gzip', gzip.decompress)])
+def test_each_encoding_has_its_own_etag(encoding, decode):
+    app, path = chart_app('image/svg+xml', SVG)
+    client = TestClient(app)
+    identity = client.get(path, headers={'Accept-Encoding': 'identity'}).headers['etag']
+    with client.stream('GET', path, headers={'Accept-Encoding': encoding}) as encoded:
+        # The body as sent, before the client decodes it
+        body = b''.join(encoded.iter_raw())
+    assert encoded.headers['content-encoding'] == encoding
+    assert encoded.headers['etag'] == identity[:-1] + '-' + encoding + '"'
+    assert decode(body) == SVG
+
+    # An ETag only matches the representation it was given for
+    assert client.get(path, headers={'Accept-Encoding': encoding, 'If-None-Match': identity}).status_code == 200
+    assert client.get(path, headers={'Accept-Encoding': encoding,
+                                     'If-None-Match': encoded.headers['etag']}).status_code == 304
+    assert client.get(path, headers={'Accept-Encoding': 'identity',
+                                     'If-None-Match': encoded.headers['etag']}).status_code == 200
+    assert app.state.renders == 1
+
+
+def test_compressed_formats_are_sent_as_is():
+    app, path = chart_app('image/png', b'\x89PNG' + bytes(range(256)) * 8)
+    response = TestClient(app).get(path, headers={'Accept-Encoding': 'br, gzip'})
+    assert 'content-encoding' not in response.headers
+    assert 'vary' not in response.headers
+    assert response.headers['etag'].endswith('"') and '-' not in response.headers['etag']
+
+
+class DownUpstream:
+    # Stands in for upstream_client when the backend fails: every load gets error
+    def __init__(self, error):
+        self.error = error
+
+    @asynccontextmanager
+    async def stream(self, endpoint, headers=None, params=None):
+        request = httpx.Request('POST', f'/{endpoint}')
+        if self.error != 500:
+            raise httpx.ConnectError('Connection refused', request=request)
+        yield httpx.Response(500, request=request)
+
+
+@pytest.mark.parametrize('error, detail', [(500, 'HTTP error'), ('refused', 'Request error')])
+@pytest.mark.parametrize('path', ['/lungCancer/Lung_Cancer_Gender_Distribution', '/lungCancer/bundle',
+                                  '/factorsOfHeartDiseases/ageVsDisease',
+                                  '/patientSugarLevel/patient/1/monthlySugarReport'])
+def test_upstream_failure_is_a_400_with_detail(monkeypatch, path, error, detail):
+    monkeypatch.setattr(dataset_cache, 'client', DownUpstream(error))
+    monkeypatch.setattr(dataset_cache, 'store', None)
+    monkeypatch.setattr(dataset_cache, '_entries', {})
+    chart_cache.clear()
+    response = TestClient(service).get(path, params={'format': 'json'})
+    assert response.status_code == 400
+    assert response.json()['detail'].startswith(detail)
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+from starlette.datastructures import QueryParams
+
+from app.services.cohorts import Cohort, CohortIndex, popcount
+
+
+def frame(rows=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'id': pd.Series(np.arange(rows), dtype='int32'),
+        'Sex': pd.Categorical(rng.choice(['Female', 'Male'], rows)),
+        'Race': rng.choice(['Asian', 'Black', 'White'], rows).astype(object),
+        'smoking': pd.Series(rng.choice([1, 2], rows), dtype='int8'),
+        'BMI': pd.Series(rng.uniform(15, 45, rows), dtype='float32'),
+    })
+
+
+DERIVED = {'Obese': lambda frame: np.where(frame['BMI'] >= 30, 'Yes', 'No')}
+LABELS = {'smoking': {1: 'No', 2: 'Yes'}}
+
+
+def cohort(query, exclude=('format',)):
+    return Cohort.from_query(QueryParams(query), exclude=exclude)
+
+
+def test_query_parameters_become_sorted_filters():
+    assert cohort('Sex=Male&Race=White&Race=Asian&format=png').filters == (
+        ('Race', ('Asian', 'White')), ('Sex', ('Male',)))
+    assert cohort('Race=White&Sex=Male&Race=Asian') == cohort('Sex=Male&Race=Asian&Race=White')
+    assert not cohort('format=png')
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('Sex=Female', lambda f: f.Sex == 'Female'),
+    ('Race=Asian&Race=White', lambda f: f.Race.isin(['Asian', 'White'])),
+    ('Sex=Male&Race=Black&smoking=Yes', lambda f: (f.Sex == 'Male') & (f.Race == 'Black') & (f.smoking == 2)),
+    ('smoking=1', lambda f: f.smoking == 1),
+    ('smoking=2&smoking=Yes', lambda f: f.smoking == 2),
+    ('Obese=Yes&Sex=Female', lambda f: (f.BMI >= 30) & (f.Sex == 'Female')),
+])
+def test_select_matches_pandas(query, expected):
+    data = frame()
+    index = CohortIndex.build(data, DERIVED, labels=LABELS)
+    bits = index.select(cohort(query))
+    np.testing.assert_array_equal(index.mask(bits), expected(data).to_numpy())
+    assert popcount(bits) == expected(data).sum()
+
+
+def test_extend_matches_a_full_build():
+    data = frame(1000)
+    # Split mid-word, with a race first seen in the appended rows
+    head, tail = data.iloc[:613], data.iloc[613:].copy()
+    tail['Race'] = tail['Race'].where(tail.index % 3 != 0, 'Other')
+    whole = pd.concat([head, tail], ignore_index=True)
+    built = CohortIndex.build(whole, DERIVED, labels=LABELS)
+    extended = CohortIndex.build(head, DERIVED, labels=LABELS).extend(tail.reset_index(drop=True), DERIVED)
+    assert extended.rows == built.rows
+    for name, bitmaps in built.bitmaps.items():
+        if bitmaps is None:
+            assert extended.bitmaps[name] is None
+            continue
+        assert set(extended.bitmaps[name]) == set(bitmaps)
+        for value, bits in bitmaps.items():
+            np.testing.assert_array_equal(extended.bitmaps[name][value], bits)
+
+
+@pytest.mark.parametrize('query, status, detail', [
+    ('sex=Female', 422, "Unknown query parameter 'sex'"),
+    ('Sex=Other', 422, "Unknown Sex value 'Other'"),
+    ('smoking=3', 422, "Unknown smoking value '3'"),
+    ('BMI=20', 422, 'BMI has too many distinct values'),
+    ('id=4', 422, 'id has too many distinct values'),
+])
+def test_invalid_filters_are_rejected(query, status, detail):
+    index = CohortIndex.build(frame(), DERIVED, labels=LABELS)
+    with pytest.raises(HTTPException) as error:
+        index.select(cohort(query))
+    assert error.value.status_code == status
+    assert error.value.detail.startswith(detail)
+
+
+def test_empty_cohort_is_a_bad_request():
+    data = frame(10)
+    data['Sex'] = pd.Categorical(['Male'] * 10, categories=['Female', 'Male'])
+    with pytest.raises(HTTPException) as error:
+        CohortIndex.build(data).select(cohort('Sex=Female'))
+    assert error.value.status_code == 400
@@ -0,0 +1,77 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.correlations import CORRELATIONS, CorrelationCache, CorrelationStats
+from app.services.datasetCache import CachedDataset, HEART_DISEASE, LUNG_CANCER
+from benchmarks.synthetic import FRAMES
+
+
+def numeric(rows=500, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=rows)
+    frame = pd.DataFrame({'x': x, 'y': 2 * x + rng.normal(size=rows), 'z': rng.uniform(size=rows)})
+    frame.loc[rng.choice(rows, rows // 20, replace=False), 'z'] = np.nan
+    return frame
+
+
+def test_matrix_matches_pandas_over_complete_rows():
+    frame = numeric()
+    stats = CorrelationStats.build(frame)
+    assert stats.rows == len(frame)
+    assert stats.n == len(frame.dropna())
+    pd.testing.assert_frame_equal(stats.correlation(), frame.dropna().corr())
+
+
+@pytest.mark.parametrize('splits', [[250], [1, 499], [0, 100, 400], [500]])
+def test_merged_parts_match_a_single_build(splits):
+    frame = numeric()
+    bounds = [0, *splits, len(frame)]
+    parts = [CorrelationStats.build(frame.iloc[start:stop]) for start, stop in zip(bounds, bounds[1:])]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged = merged.merge(part)
+    whole = CorrelationStats.build(frame)
+    assert (merged.n, merged.rows) == (whole.n, whole.rows)
+    pd.testing.assert_frame_equal(merged.correlation(), whole.correlation())
+
+
+def test_constant_column_has_no_correlation():
+    frame = numeric().assign(z=1.0)
+    matrix = CorrelationStats.build(frame).correlation()
+    assert matrix['z'].isna().all()
+    assert matrix.loc['x', 'y'] == pytest.approx(frame['x'].corr(frame['y']))
+
+
+def test_merging_different_columns_fails():
+    with pytest.raises(ValueError):
+        CorrelationStats.build(numeric()).merge(CorrelationStats.build(numeric()[['x', 'y']]))
+
+
+class Datasets:
+    # Stands in for dataset_cache, serving whichever snapshot the test sets
+    def __init__(self, entry):
+        self.entry = entry
+
+    async def get(self, endpoint):
+        return self.entry
+
+
+@pytest.mark.parametrize('endpoint', [HEART_DISEASE, LUNG_CANCER])
+def test_appended_rows_update_the_matrix_like_a_recompute(endpoint):
+    async def run():
+        head, tail = FRAMES[endpoint](300, seed=1), FRAMES[endpoint](200, seed=2, start=301)
+        frame = pd.concat([head, tail], ignore_index=True)
+        datasets = Datasets(CachedDataset(frame=head, version='a', fetched_at=0.0))
+        cache = CorrelationCache(datasets)
+        await cache.get(endpoint)
+        datasets.entry = CachedDataset(frame=frame, version='b', fetched_at=0.0, base_version='a', base_rows=300)
+        updated = await cache.get(endpoint)
+
+        assert (updated.version, updated.rows) == ('b', 500)
+        expected = CORRELATIONS[endpoint](frame).dropna().corr()
+        pd.testing.assert_frame_equal(updated.correlation(), expected)
+
+    asyncio.run(run())
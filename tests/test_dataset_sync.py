@@ -0,0 +1,89 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+import pandas as pd
+import pytest
+
+from app.services.aggregates import CUBES, CrossTabCube, CubeCache
+from app.services.datasetCache import DatasetCache, HEART_DISEASE
+from benchmarks.synthetic import FRAMES, records_body
+
+
+class Upstream:
+    # Stands in for upstream_client: serves frame's records and honours ?since=<id>
+    def __init__(self, frame):
+        self.frame = frame
+        self.requests = []
+
+    def append(self, rows):
+        start = int(self.frame['id'].max()) + 1
+        self.frame = pd.concat([self.frame, FRAMES[HEART_DISEASE](rows, seed=start, start=start)], ignore_index=True)
+
+    @asynccontextmanager
+    async def stream(self, endpoint, headers=None, params=None):
+        self.requests.append(params)
+        frame = self.frame
+        if params and 'since' in params:
+            frame = frame[frame['id'] > params['since']]
+        headers = {'ETag': f'"{len(frame)}"', 'Last-Modified': 'Sun, 18 Oct 2026 12:00:00 GMT'}
+        yield httpx.Response(200, content=records_body(frame), headers=headers,
+                             request=httpx.Request('POST', f'/{endpoint}'))
+
+
+def datasets(upstream, streaming, incremental=False):
+    # A TTL of 0 makes every get a reload
+    return DatasetCache(upstream, ttl=0, streaming=streaming, batch_rows=128, incremental=incremental)
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_unchanged_body_keeps_the_snapshot(streaming):
+    async def run():
+        cache = datasets(Upstream(FRAMES[HEART_DISEASE](300)), streaming)
+        first = await cache.get(HEART_DISEASE)
+        second = await cache.get(HEART_DISEASE)
+        assert second.frame is first.frame
+        assert second.version == first.version
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_incremental_sync_matches_a_full_load(streaming):
+    async def run():
+        upstream = Upstream(FRAMES[HEART_DISEASE](300))
+        cache = datasets(upstream, streaming, incremental=True)
+        first = await cache.get(HEART_DISEASE)
+        upstream.append(200)
+        synced = await cache.get(HEART_DISEASE)
+
+        assert upstream.requests[-1] == {'since': 300}
+        assert (synced.base_version, synced.base_rows, synced.high_water) == (first.version, 300, 500)
+        # The full body's validators are kept for revalidating the next full sync
+        assert (synced.etag, synced.last_modified) == ('"300"', 'Sun, 18 Oct 2026 12:00:00 GMT')
+        full = await datasets(Upstream(upstream.frame), streaming).get(HEART_DISEASE)
+        pd.testing.assert_frame_equal(synced.frame, full.frame)
+
+        # Nothing new: the snapshot is kept
+        assert (await cache.get(HEART_DISEASE)).version == synced.version
+
+    asyncio.run(run())
+
+
+def test_cube_follows_appended_rows():
+    async def run():
+        upstream = Upstream(FRAMES[HEART_DISEASE](300))
+        cache = datasets(upstream, False, incremental=True)
+        cubes = CubeCache(cache)
+        await cubes.get(HEART_DISEASE)
+        upstream.append(200)
+        updated = await cubes.get(HEART_DISEASE)
+
+        entry = await cache.get(HEART_DISEASE)
+        assert updated.version == entry.version
+        rebuilt = CrossTabCube.build(entry.frame, **CUBES[HEART_DISEASE])
+        assert updated.tables.keys() == rebuilt.tables.keys()
+        for name, table in rebuilt.tables.items():
+            pd.testing.assert_frame_equal(updated.tables[name].sort_index(), table.sort_index(), check_names=False)
+
+    asyncio.run(run())
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app as service
+from app.routes_and_controllers import patientSugarLevel
+from app.routes_and_controllers.patientSugarLevel import get_bmi_categories, get_bmi_category
+from app.services.datasetCache import CachedDataset, BLOOD_SUGAR, PATIENTS
+from app.services.encoding import bmi_category
+from app.services.patientIndex import patient_index
+from benchmarks.synthetic import FRAMES
+
+# The chart categories split Obese in two; otherwise they are the patient report's
+CHART_TO_REPORT = {'Underweight (0-18.5)': 'Underweight', 'Normal (18.5-24.9)': 'Normal weight',
+                   'Overweight (25-29.9)': 'Overweight', 'Obese (30-34.9)': 'Obese', 'Severely Obese (35+)': 'Obese'}
+
+
+def test_bmi_helpers_agree_around_every_boundary():
+    # Includes the values that used to fall in the gaps between 24.9 and 25 and between 29.9 and 30
+    bmi = np.round(np.concatenate([np.arange(start - 0.1, start + 0.1, 0.01) for start in (18.5, 25, 30, 35)]), 3)
+    bmi = np.concatenate([bmi, [24.9, 24.95, 24.99, 29.9, 29.95, 29.99, 10.0, 60.0]])
+    scalar = [get_bmi_category(value) for value in bmi]
+    assert list(get_bmi_categories(pd.Series(bmi))) == scalar
+    assert [CHART_TO_REPORT[category] for category in bmi_category(pd.Series(bmi))] == scalar
+    assert get_bmi_category(24.95) == 'Normal weight'
+    assert get_bmi_category(29.95) == 'Overweight'
+
+
+class Datasets:
+    # Stands in for dataset_cache with one snapshot per endpoint
+    def __init__(self, frames):
+        self.entries = {endpoint: CachedDataset(frame=frame, version=endpoint, fetched_at=0.0)
+                        for endpoint, frame in frames.items()}
+
+    async def get(self, endpoint):
+        return self.entries[endpoint]
+
+
+@pytest.fixture
+def patients(monkeypatch):
+    frame = FRAMES[PATIENTS](500)
+    datasets = Datasets({PATIENTS: frame, BLOOD_SUGAR: FRAMES[BLOOD_SUGAR](500)})
+    monkeypatch.setattr(patient_index, 'datasets', datasets)
+    monkeypatch.setattr(patient_index, '_indexes', {})
+    return frame
+
+
+def get(params):
+    return TestClient(service).get('/patientSugarLevel/patients/sugar-levels', params=params)
+
+
+def test_ids_are_answered_in_order_with_unknown_ones_listed(patients):
+    body = get({'ids': [42, 7, 9999, 300, 0]}).json()
+    assert [patient['id'] for patient in body['patients']] == [42, 7, 300]
+    assert body['missing'] == [9999, 0]
+    assert (body['total'], body['offset'], body['limit']) == (3, 0, 5)
+
+
+def test_batch_entry_matches_the_single_patient_report(patients):
+    batch = get({'ids': [42]}).json()['patients'][0]
+    single = TestClient(service).get('/patientSugarLevel/patient/42/sugar-levels').json()
+    assert {key: value for key, value in batch.items() if key != 'id'} == single
+
+
+def test_cohort_filter_is_paged_by_id(patients):
+    params = {'gender': 'Female', 'min_age': 40, 'max_age': 60, 'diabetic': 'true'}
+    expected = patients[(patients.gender == 'Female') & patients.age.between(40, 60)
+                        & (patients.fastingbloodsugar == 1)].sort_values('id')['id'].tolist()
+    pages = [get({**params, 'offset': offset, 'limit': 10}).json() for offset in range(0, len(expected) + 10, 10)]
+    assert all(page['total'] == len(expected) for page in pages)
+    assert [patient['id'] for page in pages for patient in page['patients']] == expected
+    assert pages[-1]['patients'] == []
+
+
+def test_unfiltered_cohort_is_every_patient(patients):
+    body = get({'offset': 495}).json()
+    assert body['total'] == 500
+    assert [patient['id'] for patient in body['patients']] == [496, 497, 498, 499, 500]
+
+
+def test_batch_limits(patients, monkeypatch):
+    assert get({'limit': patientSugarLevel.MAX_BATCH_IDS + 1}).status_code == 422
+    assert get({'offset': -1}).status_code == 422
+    monkeypatch.setattr(patientSugarLevel, 'MAX_BATCH_IDS', 3)
+    assert get({'ids': [1, 2, 3, 4]}).status_code == 400
+
+
+def test_unknown_patient_is_a_404(patients):
+    assert TestClient(service).get('/patientSugarLevel/patient/9999/sugar-levels').status_code == 404
@@ -0,0 +1,127 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+from fastapi.testclient import TestClient
+
+from app.main import app as service
+from app.routes_and_controllers import factorsOfHeartDiseases
+from app.services.datasetCache import CachedDataset, HEART_DISEASE
+from app.services.encoding import AGE_ORDER
+from app.services.riskModels import HEART_DISEASE_RISK, ModelCache, fit_model, heart_disease_design, model_cache
+from benchmarks.synthetic import FRAMES
+
+
+def heart(rows=3000, seed=0, start=1):
+    return FRAMES[HEART_DISEASE](rows, seed=seed, start=start)
+
+
+def cold_fit(frame, columns=None):
+    X, y = heart_disease_design(frame)
+    return sm.Logit(y, X if columns is None else X[columns]).fit(disp=0)
+
+
+def test_fit_matches_a_cold_statsmodels_fit():
+    frame = heart()
+    model = fit_model(HEART_DISEASE_RISK, frame, 'a')
+    expected = cold_fit(frame)
+    pd.testing.assert_series_equal(model.params, expected.params)
+    pd.testing.assert_frame_equal(model.cov, expected.cov_params())
+    assert (model.nobs, model.warm_start, model.converged) == (len(frame), False, True)
+
+
+def test_warm_start_converges_to_the_cold_solution():
+    head = heart()
+    frame = pd.concat([head, heart(500, seed=1, start=3001)], ignore_index=True)
+    previous = fit_model(HEART_DISEASE_RISK, head, 'a')
+    warm = fit_model(HEART_DISEASE_RISK, frame, 'b', previous)
+    cold = fit_model(HEART_DISEASE_RISK, frame, 'b')
+    assert warm.warm_start
+    assert warm.iterations <= cold.iterations
+    np.testing.assert_allclose(warm.params, cold.params, rtol=1e-6, atol=1e-8)
+
+
+def test_constant_feature_is_dropped():
+    frame = heart()
+    women = frame[frame['Sex'] == 'Female']
+    # Warm-started from a model that still has the Sex term
+    model = fit_model(HEART_DISEASE_RISK, women, 'a', fit_model(HEART_DISEASE_RISK, frame, 'a'))
+    assert list(model.params.index) == ['const', 'AgeCategory', 'BMI']
+    np.testing.assert_allclose(model.params, cold_fit(women, ['const', 'AgeCategory', 'BMI']).params, rtol=1e-6)
+
+
+class Datasets:
+    # Stands in for dataset_cache, serving one snapshot
+    def __init__(self, entry):
+        self.entry = entry
+
+    async def get(self, endpoint):
+        return self.entry
+
+
+def test_concurrent_requests_share_one_fit():
+    async def run():
+        cache = ModelCache(Datasets(CachedDataset(frame=heart(), version='a', fetched_at=0.0)))
+        models = await asyncio.gather(*(cache.get(HEART_DISEASE_RISK) for _ in range(4)))
+        assert all(model is models[0] for model in models)
+
+    asyncio.run(run())
+
+
+@pytest.fixture
+def client(monkeypatch):
+    frame = heart()
+    monkeypatch.setattr(model_cache, 'datasets', Datasets(CachedDataset(frame=frame, version='a' * 64, fetched_at=0.0)))
+    monkeypatch.setattr(model_cache, '_models', {})
+    client = TestClient(service)
+    client.expected = cold_fit(frame)
+    return client
+
+
+def probability(expected, age, bmi, sex):
+    x = np.array([1.0, AGE_ORDER.index(age) + 1, bmi, 1.0 if sex == 'Male' else 0.0])
+    return float(1 / (1 + np.exp(-x @ expected.params.to_numpy())))
+
+
+def test_model_route_reports_the_fit(client):
+    body = client.get('/factorsOfHeartDiseases/model').json()
+    assert body['observations'] == 3000
+    assert [row['term'] for row in body['coefficients']] == list(client.expected.params.index)
+    np.testing.assert_allclose([row['coefficient'] for row in body['coefficients']], client.expected.params)
+
+
+def test_predict_route(client):
+    response = client.get('/factorsOfHeartDiseases/model/predict',
+                          params={'AgeCategory': '60-64', 'BMI': 31.5, 'Sex': 'Male'})
+    body = response.json()
+    assert body['probability'] == pytest.approx(probability(client.expected, '60-64', 31.5, 'Male'))
+    assert body['ci_low'] < body['probability'] < body['ci_high']
+
+
+@pytest.mark.parametrize('params', [{'AgeCategory': '60', 'BMI': 31.5, 'Sex': 'Male'},
+                                    {'AgeCategory': '60-64', 'BMI': 31.5, 'Sex': 'male'},
+                                    {'AgeCategory': '60-64', 'BMI': 0, 'Sex': 'Male'},
+                                    {'AgeCategory': '60-64', 'Sex': 'Male'}])
+def test_predict_route_rejects_bad_features(client, params):
+    assert client.get('/factorsOfHeartDiseases/model/predict', params=params).status_code == 422
+
+
+def test_score_one_or_many(client):
+    patients = [{'AgeCategory': '18-24', 'BMI': 22.0, 'Sex': 'Female'},
+                {'AgeCategory': '80 or older', 'BMI': 35.0, 'Sex': 'Male'}]
+    single = client.post('/factorsOfHeartDiseases/score', json=patients[0]).json()
+    assert single['probability'] == pytest.approx(probability(client.expected, '18-24', 22.0, 'Female'))
+    batch = client.post('/factorsOfHeartDiseases/score', json=patients).json()
+    assert batch['count'] == 2
+    assert batch['probabilities'] == pytest.approx([probability(client.expected, p['AgeCategory'], p['BMI'], p['Sex'])
+                                                    for p in patients])
+
+
+def test_score_limits(client, monkeypatch):
+    monkeypatch.setattr(factorsOfHeartDiseases, 'MAX_SCORE_ROWS', 2)
+    patient = {'AgeCategory': '18-24', 'BMI': 22.0, 'Sex': 'Female'}
+    assert client.post('/factorsOfHeartDiseases/score', json=[patient] * 3).status_code == 413
+    assert client.post('/factorsOfHeartDiseases/score', json=[patient, {**patient, 'BMI': -1}]).status_code == 422
+    assert client.post('/factorsOfHeartDiseases/score', json={**patient, 'Sex': 'X'}).status_code == 422
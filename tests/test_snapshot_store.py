@@ -0,0 +1,43 @@
+import pandas as pd
+
+from app.services.snapshotStore import SnapshotStore
+
+
+def frame():
+    return pd.DataFrame({
+        'id': pd.Series([1, 2, 3], dtype='int32'),
+        'Sex': pd.Categorical(['Male', 'Female', 'Male']),
+        'BMI': pd.Series([22.5, 31.0, 27.25], dtype='float32'),
+        'Name': ['a', 'b', None],
+    })
+
+
+def test_round_trip_keeps_rows_types_and_metadata(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    assert store.save('data', frame(), version='abc', etag='"e"', high_water=3, full_synced_at=12.5)
+
+    loaded, info = store.load('data')
+    pd.testing.assert_frame_equal(loaded, frame())
+    assert info['version'] == 'abc'
+    assert info['etag'] == '"e"'
+    assert info['high_water'] == 3
+    assert info['full_synced_at'] == 12.5
+    assert store.saved_version('data') == 'abc'
+
+
+def test_same_version_is_not_rewritten(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    assert store.save('data', frame(), version='abc')
+    assert not store.save('data', frame(), version='abc')
+    assert store.save('data', frame().iloc[:2], version='def')
+    assert len(store.load('data')[0]) == 2
+
+
+def test_missing_or_corrupt_snapshot_loads_as_none(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    assert store.load('data') is None
+    assert store.saved_version('data') is None
+    with open(store.path('data'), 'wb') as file:
+        file.write(b'not arrow')
+    assert store.load('data') is None
+    assert store.saved_version('data') is None